@@ -4,8 +4,10 @@ Script para verificar que todos los archivos necesarios existen
 """
 import os
 import sys
+from pathlib import PurePosixPath
 
-REQUIRED_FILES = [
+# Tuplas: el informe sigue el orden de declaración
+REQUIRED_FILES = (
     'requirements.txt',
     'setup.sh',
     'main.py',
@@ -27,9 +29,9 @@ REQUIRED_FILES = [
     'utils/__init__.py',
     'utils/preset_manager.py',
     'utils/logger.py',
-]
+)
 
-REQUIRED_DIRS = [
+REQUIRED_DIRS = (
     'config',
     'core',
     'database',
@@ -38,35 +40,71 @@ REQUIRED_DIRS = [
     'data',
     'outputs',
     'renders_input',
-]
+)
+
+SKIP_DIRS = frozenset({'.git', 'venv', '.venv', '__pycache__', 'node_modules'})
+
+def scan_present(required_files=REQUIRED_FILES, required_dirs=REQUIRED_DIRS):
+    """
+    Recorre el arbol una sola vez y devuelve los archivos y directorios
+    requeridos que existen (dos sets, solo para pertenencia)
+    
+    os.walk lista cada directorio con un solo scandir. Solo se desciende a
+    directorios que pueden contener rutas requeridas, asi que venv/, .git/
+    o outputs/ llenos de renders no se recorren.
+    """
+    required_files = set(required_files)
+    required_dirs = set(required_dirs)
+    # Podar: solo bajar a ancestros (a cualquier profundidad) de rutas requeridas
+    wanted_parents = {
+        str(parent) for path in required_files | required_dirs
+        for parent in PurePosixPath(path).parents
+    } | {''}
+    present_files = set()
+    present_dirs = set()
+    
+    for root, dirs, files in os.walk('.', topdown=True):
+        rel_root = os.path.relpath(root, '.')
+        rel_root = '' if rel_root == '.' else rel_root.replace(os.sep, '/')
+        
+        for d in dirs:
+            rel_dir = rel_root + '/' + d if rel_root else d
+            if rel_dir in required_dirs:
+                present_dirs.add(rel_dir)
+        for f in files:
+            rel_file = rel_root + '/' + f if rel_root else f
+            if rel_file in required_files:
+                present_files.add(rel_file)
+        
+        dirs[:] = [
+            d for d in dirs
+            if d not in SKIP_DIRS and (rel_root + '/' + d if rel_root else d) in wanted_parents
+        ]
+    
+    return present_files, present_dirs
 
 def check_setup():
     """Verifica que todos los archivos existen"""
     
     print("Verificando estructura del proyecto...\n")
     
-    missing_files = []
-    missing_dirs = []
+    present_files, present_dirs = scan_present()
+    missing_dirs = [d for d in REQUIRED_DIRS if d not in present_dirs]
+    missing_files = [f for f in REQUIRED_FILES if f not in present_files]
     
     # Verificar directorios
     print("Verificando directorios:")
     for dir_name in REQUIRED_DIRS:
-        if os.path.isdir(dir_name):
-            print("   OK {}/".format(dir_name))
-        else:
-            print("   FALTA {}/".format(dir_name))
-            missing_dirs.append(dir_name)
+        status = "FALTA" if dir_name in missing_dirs else "OK"
+        print("   {} {}/".format(status, dir_name))
     
     print()
     
     # Verificar archivos
     print("Verificando archivos:")
     for file_path in REQUIRED_FILES:
-        if os.path.isfile(file_path):
-            print("   OK {}".format(file_path))
-        else:
-            print("   FALTA {}".format(file_path))
-            missing_files.append(file_path)
+        status = "FALTA" if file_path in missing_files else "OK"
+        print("   {} {}".format(status, file_path))
     
     print()
     
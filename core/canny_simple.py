@@ -1,15 +1,32 @@
 # -*- coding: utf-8 -*-
 """
-Detector de bordes Canny simple sin OpenCV
+Detector de bordes Canny simple
+Usa OpenCV (SIMD) si está instalado; si no, scikit-image
 """
+from functools import lru_cache
 from PIL import Image
 import numpy as np
 from skimage import feature
 
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+@lru_cache(maxsize=16)
+def _normalize_thresholds(low_threshold, high_threshold):
+    """Convierte umbrales 0-255 a la escala 0-1 de scikit-image (memoizado)"""
+    return low_threshold / 255.0, high_threshold / 255.0
+
+
 class CannyDetector:
-    """Detector Canny usando scikit-image"""
+    """Detector Canny usando OpenCV o scikit-image"""
+    
+    def __init__(self, sigma=1.0):
+        self.sigma = sigma
     
-    def __call__(self, image, low_threshold=100, high_threshold=200):
+    def __call__(self, image, low_threshold=100, high_threshold=200, return_mode='L'):
         """
         Detecta bordes usando algoritmo Canny
         
@@ -17,30 +34,38 @@ class CannyDetector:
             image: PIL Image
             low_threshold: Umbral bajo (0-255)
             high_threshold: Umbral alto (0-255)
+            return_mode: 'L' (un canal) o 'RGB'
             
         Returns:
-            PIL Image con bordes detectados
+            PIL Image con bordes detectados (modo `return_mode`)
         """
         # Convertir a escala de grises
         if image.mode != 'L':
             image = image.convert('L')
         
-        gray = np.array(image)
+        # Vista de solo lectura sobre los bytes de PIL (ni cv2 ni skimage la modifican)
+        gray = np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(image.height, image.width)
+        
+        if cv2 is not None:
+            # OpenCV no suaviza internamente: aplicar el mismo Gaussiano que skimage
+            blurred = cv2.GaussianBlur(gray, (0, 0), self.sigma)
+            edges = cv2.Canny(blurred, low_threshold, high_threshold, apertureSize=3, L2gradient=False)
+            edges = Image.fromarray(edges)
+            return edges if return_mode == 'L' else edges.convert(return_mode)
         
         # Normalizar umbrales (0-1)
-        low = low_threshold / 255.0
-        high = high_threshold / 255.0
+        low, high = _normalize_thresholds(low_threshold, high_threshold)
         
         # Aplicar Canny
         edges = feature.canny(
             gray,
-            sigma=1.0,
+            sigma=self.sigma,
             low_threshold=low,
             high_threshold=high
         )
         
-        # Convertir a imagen RGB
+        # Un solo canal: la expansión a 3 canales la hace el generador como vista
         edges_uint8 = (edges * 255).astype(np.uint8)
-        edges_rgb = Image.fromarray(edges_uint8).convert('RGB')
         
-        return edges_rgb
+        edges = Image.fromarray(edges_uint8)
+        return edges if return_mode == 'L' else edges.convert(return_mode)
@@ -3,9 +3,79 @@ Sistema de detección de bordes sin OpenCV
 Implementa múltiples algoritmos combinables para mejor calidad
 """
 
-from PIL import Image, ImageFilter, ImageOps
+import math
+from functools import lru_cache
+from PIL import Image, ImageChops, ImageFilter, ImageOps
 import numpy as np
 
+# Kernel Sobel fusionado (opcional)
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _sobel_magnitude(padded, out):
+        """
+        Sobel X/Y + magnitud en una sola pasada sobre la imagen
+        
+        `padded` lleva 1 px de borde reflejado (como ndimage.sobel 'reflect');
+        lee la entrada una vez y escribe `out` una vez, sin temporales.
+        """
+        height, width = out.shape
+        for i in prange(height):
+            for j in range(width):
+                a = padded[i, j]
+                b = padded[i, j + 1]
+                c = padded[i, j + 2]
+                d = padded[i + 1, j]
+                f = padded[i + 1, j + 2]
+                g = padded[i + 2, j]
+                h = padded[i + 2, j + 1]
+                k = padded[i + 2, j + 2]
+                gx = (c + 2 * f + k) - (a + 2 * d + g)
+                gy = (g + 2 * h + k) - (a + 2 * b + c)
+                out[i, j] = math.sqrt(gx * gx + gy * gy)
+
+
+@lru_cache(maxsize=1)
+def _scipy_ndimage():
+    """scipy.ndimage o None; el intento de import se hace una sola vez"""
+    try:
+        from scipy import ndimage
+    except ImportError:
+        print("⚠️  scipy no disponible, usando SimplePillowEdgeDetector")
+        return None
+    return ndimage
+
+
+@lru_cache(maxsize=1)
+def _skimage_feature():
+    """skimage.feature o None; el intento de import se hace una sola vez"""
+    try:
+        from skimage import feature
+    except ImportError:
+        print("⚠️  scikit-image no disponible, usando SobelEdgeDetector")
+        return None
+    return feature
+
+
+# Máximo teórico de hypot(gx, gy) del Sobel 3x3 sobre uint8: sqrt(2) * 4 * 255
+_SOBEL_MAX_MAGNITUDE = math.sqrt(2) * 1020
+
+
+def _to_mode(edges, return_mode):
+    """Mapa 'L' interno -> modo pedido; solo se expande a RGB en la salida"""
+    return edges if return_mode == 'L' else edges.convert(return_mode)
+
+
+@lru_cache(maxsize=16)
+def _threshold_lut(threshold):
+    """LUT de binarización: 0 hasta `threshold` inclusive, 255 por encima"""
+    return [0] * (threshold + 1) + [255] * (255 - threshold)
+
 
 class SimplePillowEdgeDetector:
     """
@@ -13,83 +83,98 @@ class SimplePillowEdgeDetector:
     Rápido y ligero, sin dependencias adicionales
     """
     
-    def __call__(self, image, threshold=128):
+    def __call__(self, image, threshold=128, return_mode='RGB'):
         """
         Detecta bordes usando filtros de Pillow
         
         Args:
             image: PIL Image
             threshold: Umbral para binarización (0-255)
+            return_mode: 'RGB' (ControlNet) o 'L' (un canal)
             
         Returns:
             PIL Image con bordes detectados
         """
         # Convertir a escala de grises
-        if image.mode != 'L':
-            gray = image.convert('L')
-        else:
-            gray = image
+        gray = image if image.mode == 'L' else image.convert('L')
         
+        # Convertir a RGB para ControlNet
+        return _to_mode(self._from_gray(gray, threshold), return_mode)
+    
+    def _from_gray(self, gray, threshold=128):
+        """Bordes (PIL 'L') a partir de una imagen ya en escala de grises"""
         # Aplicar filtro de detección de bordes
         edges = gray.filter(ImageFilter.FIND_EDGES)
         
         # Mejorar contraste
         edges = ImageOps.autocontrast(edges)
         
-        # Binarizar
-        edges = edges.point(lambda x: 255 if x > threshold else 0)
-        
-        # Convertir a RGB para ControlNet
-        return edges.convert('RGB')
+        # Binarizar (tabla de 256 entradas aplicada en C por Pillow)
+        return edges.point(_threshold_lut(threshold))
+
+
+# Fallback compartido: los caminos de error no instancian detectores
+_FALLBACK_PILLOW = SimplePillowEdgeDetector()
 
 
 class SobelEdgeDetector:
     """
     Detector de bordes usando operador Sobel
-    Mejor calidad que Pillow, requiere scipy
+    Mejor calidad que Pillow, requiere numba o scipy
     """
     
-    def __call__(self, image, threshold=30):
+    def __call__(self, image, threshold=30, return_mode='RGB'):
         """
         Detecta bordes usando operador Sobel
         
         Args:
             image: PIL Image
             threshold: Umbral para binarización
+            return_mode: 'RGB' (ControlNet) o 'L' (un canal)
             
         Returns:
             PIL Image con bordes detectados
         """
-        try:
-            from scipy import ndimage
-        except ImportError:
-            print("⚠️  scipy no disponible, usando SimplePillowEdgeDetector")
-            return SimplePillowEdgeDetector()(image)
-        
-        # Convertir a escala de grises y array
-        if image.mode != 'L':
-            gray = image.convert('L')
-        else:
-            gray = image
-        
-        gray_array = np.array(gray)
-        
-        # Operador Sobel en X e Y
-        sobel_x = ndimage.sobel(gray_array, axis=1)
-        sobel_y = ndimage.sobel(gray_array, axis=0)
-        
-        # Magnitud del gradiente
-        magnitude = np.hypot(sobel_x, sobel_y)
-        
-        # Normalizar a 0-255
-        magnitude = (magnitude / magnitude.max() * 255).astype(np.uint8)
-        
-        # Binarizar
-        magnitude[magnitude < threshold] = 0
-        magnitude[magnitude >= threshold] = 255
+        # Convertir a escala de grises
+        gray = image if image.mode == 'L' else image.convert('L')
         
         # Convertir a PIL Image RGB
-        return Image.fromarray(magnitude).convert('RGB')
+        return _to_mode(self._from_gray(gray, threshold), return_mode)
+    
+    def _from_gray(self, gray, threshold=30):
+        """Bordes (PIL 'L') a partir de una imagen ya en escala de grises"""
+        if njit is None:
+            ndimage = _scipy_ndimage()
+            if ndimage is None:
+                return _FALLBACK_PILLOW._from_gray(gray)
+        
+        # float32: la mitad de bytes que float64 y sin desbordar como uint8
+        gray_array = np.asarray(gray, dtype=np.float32)
+        
+        if njit is not None:
+            # Kernel fusionado (buffer por llamada: el detector se comparte entre hilos)
+            magnitude = np.empty(gray_array.shape, dtype=np.float32)
+            _sobel_magnitude(np.pad(gray_array, 1, mode='symmetric'), magnitude)
+        else:
+            # Operador Sobel en X e Y
+            sobel_x = ndimage.sobel(gray_array, axis=1, output=np.float32)
+            sobel_y = ndimage.sobel(gray_array, axis=0, output=np.float32)
+            
+            # Magnitud del gradiente (in-place sobre sobel_x)
+            np.multiply(sobel_x, sobel_x, out=sobel_x)
+            np.multiply(sobel_y, sobel_y, out=sobel_y)
+            np.add(sobel_x, sobel_y, out=sobel_x)
+            magnitude = np.sqrt(sobel_x, out=sobel_x)
+        
+        # Binarizar contra una escala fija: el umbral (0-255) se lleva al rango
+        # teórico de la magnitud en vez de recorrer el array buscando su máximo
+        scaled_threshold = threshold * (_SOBEL_MAX_MAGNITUDE / 255.0)
+        edges = np.greater_equal(magnitude, scaled_threshold).view(np.uint8) * np.uint8(255)
+        
+        return Image.fromarray(edges)
+
+
+_FALLBACK_SOBEL = SobelEdgeDetector()
 
 
 class SkimageCannyDetector:
@@ -98,7 +183,7 @@ class SkimageCannyDetector:
     Mejor calidad, algoritmo Canny completo
     """
     
-    def __call__(self, image, sigma=1.0, low_threshold=0.1, high_threshold=0.3):
+    def __call__(self, image, sigma=1.0, low_threshold=0.1, high_threshold=0.3, return_mode='RGB'):
         """
         Detecta bordes usando algoritmo Canny
         
@@ -107,23 +192,24 @@ class SkimageCannyDetector:
             sigma: Desviación estándar del filtro Gaussiano
             low_threshold: Umbral bajo (0-1)
             high_threshold: Umbral alto (0-1)
+            return_mode: 'RGB' (ControlNet) o 'L' (un canal)
             
         Returns:
             PIL Image con bordes detectados
         """
-        try:
-            from skimage import feature
-        except ImportError:
-            print("⚠️  scikit-image no disponible, usando SobelEdgeDetector")
-            return SobelEdgeDetector()(image)
-        
-        # Convertir a escala de grises y array
-        if image.mode != 'L':
-            gray = image.convert('L')
-        else:
-            gray = image
+        # Convertir a escala de grises
+        gray = image if image.mode == 'L' else image.convert('L')
+        
+        # Convertir a PIL Image RGB
+        return _to_mode(self._from_gray(gray, sigma, low_threshold, high_threshold), return_mode)
+    
+    def _from_gray(self, gray, sigma=1.0, low_threshold=0.1, high_threshold=0.3):
+        """Bordes (PIL 'L') a partir de una imagen ya en escala de grises"""
+        feature = _skimage_feature()
+        if feature is None:
+            return _FALLBACK_SOBEL._from_gray(gray)
         
-        gray_array = np.array(gray)
+        gray_array = np.asarray(gray)
         
         # Aplicar algoritmo Canny
         edges = feature.canny(
@@ -136,8 +222,7 @@ class SkimageCannyDetector:
         # Convertir booleano a uint8
         edges_uint8 = (edges * 255).astype(np.uint8)
         
-        # Convertir a PIL Image RGB
-        return Image.fromarray(edges_uint8).convert('RGB')
+        return Image.fromarray(edges_uint8)
 
 
 class MultiScaleEdgeDetector:
@@ -146,51 +231,60 @@ class MultiScaleEdgeDetector:
     Detecta bordes a diferentes escalas y los combina
     """
     
-    def __call__(self, image, scales=[1.0, 0.5, 0.25]):
+    def __call__(self, image, scales=[1.0, 0.5, 0.25], return_mode='RGB'):
         """
         Detecta bordes a múltiples escalas
         
         Args:
             image: PIL Image
             scales: Lista de escalas a procesar
+            return_mode: 'RGB' (ControlNet) o 'L' (un canal)
             
         Returns:
             PIL Image con bordes detectados
         """
-        edges_list = []
-        
-        for scale in scales:
-            # Redimensionar
-            if scale != 1.0:
-                size = (int(image.width * scale), int(image.height * scale))
-                scaled = image.resize(size, Image.Resampling.LANCZOS)
-            else:
-                scaled = image
-            
-            # Detectar bordes en esta escala
-            gray = scaled.convert('L')
-            edges = gray.filter(ImageFilter.FIND_EDGES)
-            
-            # Volver al tamaño original si es necesario
-            if scale != 1.0:
-                edges = edges.resize(image.size, Image.Resampling.LANCZOS)
-            
-            edges_list.append(np.array(edges))
-        
-        # Combinar escalas (máximo)
-        combined = np.max(edges_list, axis=0)
+        # Escala de grises antes de la pirámide: cada resize mueve 1 canal, no 3
+        gray = image if image.mode == 'L' else image.convert('L')
         
-        # Normalizar
-        if combined.max() > 0:
-            combined = (combined / combined.max() * 255).astype(np.uint8)
-        else:
-            combined = combined.astype(np.uint8)
+        return _to_mode(self._from_gray(gray, scales), return_mode)
+    
+    def _from_gray(self, gray, scales=(1.0, 0.5, 0.25)):
+        """Bordes (PIL 'L') a partir de una imagen ya en escala de grises"""
+        # Pirámide: cada nivel se reduce desde el anterior con BOX (promedio,
+        # mucho más barato que LANCZOS desde la imagen completa)
+        levels = []
+        current = gray
+        for scale in sorted(scales, reverse=True):
+            size = (max(1, int(gray.width * scale)), max(1, int(gray.height * scale)))
+            if size != current.size:
+                current = current.resize(size, Image.Resampling.BOX)
+            levels.append(current.filter(ImageFilter.FIND_EDGES))
+        
+        # Fusión de abajo hacia arriba: subir cada nivel con bilineal y
+        # quedarse con el máximo píxel a píxel (ImageChops, sin copias numpy)
+        merged = levels[-1]
+        for edges in reversed(levels[:-1]):
+            merged = ImageChops.lighter(edges, merged.resize(edges.size, Image.Resampling.BILINEAR))
+        
+        if merged.size != gray.size:
+            merged = merged.resize(gray.size, Image.Resampling.BILINEAR)
+        
+        combined = np.asarray(merged)
+        
+        # Normalizar (innecesario si ya llega a 255 o si no hay bordes)
+        peak = combined.max()
+        if 0 < peak < 255:
+            combined = (combined / peak * 255).astype(np.uint8)
         
         # Mejorar contraste
-        result = Image.fromarray(combined)
-        result = ImageOps.autocontrast(result)
-        
-        return result.convert('RGB')
+        return ImageOps.autocontrast(Image.fromarray(combined))
+
+
+# Suavizado final del detector híbrido: 3x3 ('light') o 5x5 ('heavy')
+_SMOOTHING_FILTERS = {
+    'light': ImageFilter.SMOOTH,
+    'heavy': ImageFilter.SMOOTH_MORE,
+}
 
 
 class HybridEdgeDetector:
@@ -203,7 +297,8 @@ class HybridEdgeDetector:
     Este es el detector recomendado para el MVP
     """
     
-    def __init__(self, primary='canny', secondary='sobel', combine_weight=0.7):
+    def __init__(self, primary='canny', secondary='sobel', combine_weight=0.7,
+                 smoothing='light'):
         """
         Inicializa el detector híbrido
         
@@ -211,10 +306,14 @@ class HybridEdgeDetector:
             primary: Detector principal ('canny', 'sobel', 'pillow')
             secondary: Detector secundario ('canny', 'sobel', 'pillow', None)
             combine_weight: Peso del detector principal (0-1)
+            smoothing: Suavizado final ('light', 'heavy' o None)
         """
         self.primary = primary
         self.secondary = secondary
         self.combine_weight = combine_weight
+        self.smoothing = smoothing
+        self._smooth_filter = _SMOOTHING_FILTERS.get(smoothing) if smoothing else None
+        self._primary_weight_256 = np.uint16(round(combine_weight * 256))
         
         # Inicializar detectores
         self.detectors = {
@@ -223,59 +322,73 @@ class HybridEdgeDetector:
             'pillow': SimplePillowEdgeDetector(),
             'multiscale': MultiScaleEdgeDetector()
         }
+        
+        # Resolver los detectores una sola vez (no en cada llamada)
+        self._primary_fn = self.detectors.get(primary, self.detectors['canny'])._from_gray
+        if secondary is None or secondary == primary:
+            self._secondary_fn = None
+        else:
+            self._secondary_fn = self.detectors.get(secondary, self.detectors['sobel'])._from_gray
     
-    def __call__(self, image):
+    def __call__(self, image, return_mode='RGB'):
         """
         Detecta bordes usando método híbrido
         
         Args:
             image: PIL Image
+            return_mode: 'RGB' (ControlNet) o 'L' (un canal)
             
         Returns:
             PIL Image con bordes detectados
         """
+        # Escala de grises una sola vez, compartida por ambos detectores
+        gray = image if image.mode == 'L' else image.convert('L')
+        
         # Detector principal
         try:
-            primary_detector = self.detectors.get(self.primary, self.detectors['canny'])
-            primary_edges = primary_detector(image)
+            primary_edges = self._primary_fn(gray)
         except Exception as e:
             print(f"⚠️  Error en detector principal ({self.primary}): {e}")
             print("   Usando fallback...")
-            primary_edges = SimplePillowEdgeDetector()(image)
+            primary_edges = _FALLBACK_PILLOW._from_gray(gray)
         
         # Si no hay secundario, retornar solo el primario
-        if self.secondary is None or self.secondary == self.primary:
-            return primary_edges
+        if self._secondary_fn is None:
+            return _to_mode(primary_edges, return_mode)
         
         # Detector secundario
         try:
-            secondary_detector = self.detectors.get(self.secondary, self.detectors['sobel'])
-            secondary_edges = secondary_detector(image)
+            secondary_edges = self._secondary_fn(gray)
         except Exception as e:
             print(f"⚠️  Error en detector secundario ({self.secondary}): {e}")
-            return primary_edges
+            return _to_mode(primary_edges, return_mode)
         
-        # Combinar ambos detectores
-        primary_array = np.array(primary_edges.convert('L'))
-        secondary_array = np.array(secondary_edges.convert('L'))
+        # Combinar ambos detectores (ya son mapas 'L' de un canal)
+        primary_array = np.asarray(primary_edges)
+        secondary_array = np.asarray(secondary_edges)
         
-        # Promedio ponderado
-        combined = (
-            primary_array * self.combine_weight +
-            secondary_array * (1 - self.combine_weight)
-        ).astype(np.uint8)
+        # Promedio ponderado en enteros (pesos en 1/256): uint16 en vez de
+        # dos temporales float64; 255 * 256 cabe en uint16
+        combined = primary_array.astype(np.uint16)
+        combined *= self._primary_weight_256
+        combined += secondary_array.astype(np.uint16) * np.uint16(256 - self._primary_weight_256)
+        combined >>= 8
+        combined = combined.astype(np.uint8)
         
-        # Mejorar contraste
+        # Mejorar contraste (no-op si ya ocupa todo el rango 0..255)
         result = Image.fromarray(combined)
-        result = ImageOps.autocontrast(result)
+        if combined.min() != 0 or combined.max() != 255:
+            result = ImageOps.autocontrast(result)
         
         # Aplicar un poco de suavizado para reducir ruido
-        result = result.filter(ImageFilter.SMOOTH_MORE)
-        
-        # Realzar bordes finales
-        result = ImageOps.autocontrast(result)
+        if self._smooth_filter is not None:
+            result = result.filter(self._smooth_filter)
+            
+            # Realzar bordes finales
+            if result.getextrema() != (0, 255):
+                result = ImageOps.autocontrast(result)
         
-        return result.convert('RGB')
+        return _to_mode(result, return_mode)
 
 
 # Configuraciones preestablecidas
@@ -293,22 +406,26 @@ def get_detector(quality='balanced'):
         'fast': {
             'primary': 'pillow',
             'secondary': None,
-            'combine_weight': 1.0
+            'combine_weight': 1.0,
+            'smoothing': None
         },
         'balanced': {
             'primary': 'canny',
             'secondary': 'sobel',
-            'combine_weight': 0.7
+            'combine_weight': 0.7,
+            'smoothing': 'light'
         },
         'high': {
             'primary': 'canny',
             'secondary': 'multiscale',
-            'combine_weight': 0.6
+            'combine_weight': 0.6,
+            'smoothing': 'light'
         },
         'ultra': {
             'primary': 'multiscale',
             'secondary': 'canny',
-            'combine_weight': 0.5
+            'combine_weight': 0.5,
+            'smoothing': 'heavy'
         }
     }
     
@@ -2,26 +2,251 @@
 Motor de generación de renders con sistema de carpetas organizadas
 """
 
-import torch
-from diffusers import StableDiffusionControlNetPipeline, ControlNetModel, DDIMScheduler
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 from datetime import datetime
 import json
+import gc
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Backend sin GUI
+from functools import lru_cache, partial
+from contextlib import nullcontext
 
-# Importar detector de bordes
+from core.lighting_controller import LightingController
+
+# JSON en C (opcional): metadata del proyecto en una sola pasada
 try:
-    from core.edge_detectors import HybridEdgeDetector
-    print("✓ Usando HybridEdgeDetector (scikit-image + Sobel)")
+    import orjson
 except ImportError:
-    from core.canny_simple import CannyDetector as HybridEdgeDetector
-    print("✓ Usando CannyDetector simple (fallback)")
+    orjson = None
 
-from core.lighting_controller import LightingController
+# Cachés persistentes (respetando la configuración del usuario): snapshots de
+# HuggingFace y kernels de Inductor sobreviven entre arranques. Se fijan antes
+# de importar huggingface_hub/torch, que leen estas variables al importarse
+os.environ.setdefault('HF_HOME', str(Path('.cache/hf').resolve()))
+os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', str(Path('.cache/torchinductor').resolve()))
+
+# JPEG con libvips (libjpeg-turbo, libera el GIL) si está instalado
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
+# torch, kornia y cv2 se importan al crear el primer generador (_import_backends):
+# importar este módulo (UIs, check de setup) no paga segundos de arranque
+torch = None
+kornia = None
+cv2 = None
+
+
+def _import_backends():
+    """Importa los backends pesados una sola vez y los publica en el módulo"""
+    global torch, kornia, cv2
+    if torch is not None:
+        return
+    
+    import torch as _torch
+    
+    # Canny en GPU (opcional)
+    try:
+        import kornia as _kornia
+    except ImportError:
+        _kornia = None
+    
+    # Resize vectorizado (opcional)
+    try:
+        import cv2 as _cv2
+    except ImportError:
+        _cv2 = None
+    
+    torch, kornia, cv2 = _torch, _kornia, _cv2
+
+CONTROLNET_MODEL_ID = "lllyasviel/control_v11p_sd15_canny"
+SD_MODEL_ID = "runwayml/stable-diffusion-v1-5"
+
+# Solo los archivos que usa from_pretrained (safetensors, sin .bin/.ckpt duplicados)
+_SNAPSHOT_PATTERNS = {
+    CONTROLNET_MODEL_ID: ["*.json", "diffusion_pytorch_model.safetensors"],
+    SD_MODEL_ID: [
+        "model_index.json",
+        "scheduler/*",
+        "tokenizer/*",
+        "feature_extractor/*",
+        "text_encoder/config.json",
+        "text_encoder/model.safetensors",
+        "unet/config.json",
+        "unet/diffusion_pytorch_model.safetensors",
+        "vae/config.json",
+        "vae/diffusion_pytorch_model.safetensors",
+    ],
+}
+
+# Modo rápido: LoRA de consistencia latente (LCM) + LCMScheduler
+LCM_LORA_ID = "latent-consistency/lcm-lora-sdv1-5"
+LCM_STEPS = 4
+
+DEFAULT_STYLE_PRESET = "Fotografía de Interiores Profesional"
+DEFAULT_LIGHTING_PROFILE = "natural_morning"
+
+PROMPT_SUFFIX = ", photorealistic, 4k, sharp focus, architectural photography"
+
+NEGATIVE_PROMPT = "cartoon, 3d render, painting, illustration, anime, sketch, blurry, ugly, distorted, low quality, watermark, text, oversaturated, underexposed, overexposed, bad lighting"
+
+# Relaciones de aspecto canónicas (ancho, alto). Cada una da un único shape
+# por resolución, así torch.compile y cuDNN reutilizan kernels entre renders
+ASPECT_BUCKETS = ((1, 1), (4, 3), (3, 4), (3, 2), (2, 3), (16, 9), (9, 16))
+
+
+def _bucket_size(width, height, resolution):
+    """Tamaño (múltiplo de 8) del bucket con el aspecto más cercano a la imagen"""
+    aspect = width / height
+    bucket_w, bucket_h = min(ASPECT_BUCKETS, key=lambda b: abs(b[0] / b[1] - aspect))
+    long_side = max(bucket_w, bucket_h)
+    return (resolution * bucket_w // long_side) & ~7, (resolution * bucket_h // long_side) & ~7
+
+
+def _resize(image, size):
+    """
+    Redimensiona con OpenCV (SIMD + hilos) si está disponible; si no, PIL
+    
+    INTER_AREA al reducir (fotos de cámara grandes), Lanczos al ampliar.
+    """
+    if cv2 is None or image.mode not in ('RGB', 'L'):
+        return image.resize(size, Image.Resampling.LANCZOS)
+    
+    if size[0] < image.width and size[1] < image.height:
+        interpolation = cv2.INTER_AREA
+    else:
+        interpolation = cv2.INTER_LANCZOS4
+    
+    return Image.fromarray(cv2.resize(np.asarray(image), size, interpolation=interpolation))
+
+
+# README del proyecto: separador y sección fija de estructura
+_SEP = "=" * 70 + "\n"
+_STRUCTURE_SECTION = (
+    _SEP
+    + "ESTRUCTURA DEL PROYECTO\n"
+    + _SEP + "\n"
+    + "📁 original/          → Tu render 3D original\n"
+    + "📁 renders/           → Renders fotorrealistas generados\n"
+    + "📁 controls/          → Mapas de geometría (edge detection)\n"
+    + "📁 comparatives/      → Comparativas antes/después\n"
+    + "📄 project_metadata.json → Metadata técnica completa (JSON)\n"
+    + "📄 README.txt         → Este archivo\n"
+)
+
+# Comparativas y galería: alto de las bandas de título y color de cada etiqueta
+_TITLE_HEIGHT = 60
+_LABEL_HEIGHT = 30
+_CAPTION_HEIGHT = 40
+_PANEL_LABELS = (
+    ('ORIGINAL (Render 3D)', 'black'),
+    ('GEOMETRÍA (Edge Detection)', 'black'),
+    ('FOTORREALISTA (IA Generated)', 'green'),
+)
+
+
+@lru_cache(maxsize=8)
+def _font(size, bold=False):
+    """Fuente TrueType (DejaVu) o la de Pillow por defecto si no está instalada"""
+    try:
+        return ImageFont.truetype('DejaVuSans-Bold.ttf' if bold else 'DejaVuSans.ttf', size)
+    except OSError:
+        pass
+    try:
+        return ImageFont.load_default(size)  # Pillow >= 10.1
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def _draw_centered(draw, center, text, font, fill='black'):
+    """Dibuja texto (una o varias líneas) centrado en `center`"""
+    try:
+        draw.multiline_text(center, text, fill=fill, font=font, anchor='mm', align='center')
+    except ValueError:
+        # Fuentes bitmap antiguas no admiten anchor: esquina superior izquierda
+        draw.multiline_text((center[0] - len(text) * 3, center[1] - 6), text, fill=fill, font=font)
+
+
+def _fit_height(image, height):
+    """Escala a un alto dado manteniendo el aspecto"""
+    if image.height == height:
+        return image
+    width = max(1, round(image.width * height / image.height))
+    return image.resize((width, height), Image.Resampling.BILINEAR)
+
+
+def _local_snapshot(repo_id):
+    """
+    Carpeta local con el snapshot del modelo, descargándolo solo la primera vez
+    
+    Si ya está en la caché no se consulta el Hub (arranque sin red). La
+    descarga se serializa con un lock de archivo entre procesos.
+    """
+    from huggingface_hub import snapshot_download
+    from filelock import FileLock
+    
+    patterns = _SNAPSHOT_PATTERNS.get(repo_id)
+    try:
+        return snapshot_download(repo_id, allow_patterns=patterns, local_files_only=True)
+    except Exception:
+        pass
+    
+    lock_path = Path(os.environ['HF_HOME']) / f"{repo_id.replace('/', '--')}.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with FileLock(str(lock_path)):
+        return snapshot_download(repo_id, allow_patterns=patterns)
+
+
+def _attention_context(device, torch_dtype):
+    """
+    Fábrica del contexto que limita SDPA a kernels fusionados (Flash / memory-efficient)
+    
+    Sin ella, algunas combinaciones torch/cuDNN caen en silencio al kernel
+    'math' (materializa la matriz de atención completa). Solo aplica en CUDA
+    fp16/bf16 con torch.nn.attention (PyTorch >= 2.3); si no, contexto vacío.
+    """
+    if device != 'cuda' or torch_dtype == torch.float32:
+        return nullcontext
+    try:
+        from torch.nn.attention import sdpa_kernel, SDPBackend
+    except ImportError:
+        return nullcontext
+    return partial(sdpa_kernel, [SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION])
+
+
+def _save_jpeg(image, path, quality):
+    """
+    Guarda una PIL Image como JPEG
+    
+    Con pyvips la codificación va por libjpeg-turbo sin el GIL, así que los
+    hilos de _persist_artifacts guardan en paralelo de verdad; si no, Pillow.
+    """
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    
+    if pyvips is not None:
+        pyvips.Image.new_from_array(np.asarray(image)).jpegsave(
+            str(path), Q=quality, optimize_coding=True, strip=True
+        )
+    else:
+        image.save(path, 'JPEG', quality=quality, optimize=True)
+
+
+@lru_cache(maxsize=1)
+def _get_edge_detector():
+    """Instancia única del detector de bordes, compartida por todos los generadores"""
+    try:
+        from core.edge_detectors import HybridEdgeDetector
+        print("✓ Usando HybridEdgeDetector (scikit-image + Sobel)")
+    except ImportError:
+        from core.canny_simple import CannyDetector as HybridEdgeDetector
+        print("✓ Usando CannyDetector simple (fallback)")
+    
+    return HybridEdgeDetector()
 
 
 class RenderGenerator:
@@ -29,6 +254,12 @@ class RenderGenerator:
     Generador de renders fotorrealistas con organización automática de proyectos
     """
     
+    # Pipelines ya cargados, por (controlnet, sd, precisión, device, offload).
+    # Las instancias nuevas comparten UNet/VAE/ControlNet/text encoder
+    _MODEL_CACHE = {}
+    # Claves de _MODEL_CACHE cuyo pipeline compilado ya pasó por _warmup
+    _WARMED_UP = set()
+    
     def __init__(self, hardware_profile):
         """
         Inicializa el generador
@@ -36,64 +267,615 @@ class RenderGenerator:
         Args:
             hardware_profile: Perfil de hardware del HardwareDetector
         """
+        _import_backends()
+        
         self.hardware_profile = hardware_profile
         self.device = hardware_profile['recommended_settings']['device']
         self.precision = hardware_profile['recommended_settings']['precision']
+        self.torch_dtype = self._select_dtype()
         
         self.pipe = None
-        self.edge_detector = HybridEdgeDetector()
+        self.fast_mode = False
+        self.warmed_up = False  # load_models ya precalentó los kernels compilados
+        self._negative_embeds = None
+        self._generator = None
+        self._suffix_ids = None
+        self._pinned_edges = None
+        self._upload_stream = None
+        self.edge_detector = _get_edge_detector()
         self.lighting_controller = LightingController()
+        self._attention_context = _attention_context(self.device, self.torch_dtype)
+        
+        # El pipeline (scheduler, torch.Generator) no es reentrante: con varios
+        # renders concurrentes solo se serializa la inferencia; bordes, guardado
+        # y registro en BD se solapan
+        self._pipe_lock = threading.Lock()
+        self._staging_lock = threading.Lock()  # buffer pinned compartido
+        
+        # Guardado de JPEGs y comparativas en segundo plano mientras la GPU
+        # genera el siguiente render. En MPS se guarda en línea (contención Metal)
+        self._io_pool = ThreadPoolExecutor(max_workers=2) if self.device != 'mps' else None
+        
+        # Detección de bordes en GPU: evita el viaje CPU→GPU del mapa de control
+        self.use_gpu_edges = (
+            kornia is not None
+            and self.device == 'cuda'
+            and hardware_profile['recommended_settings'].get('gpu_edge_detection', False)
+        )
+        
+    def _select_dtype(self):
+        """
+        dtype de los pesos según precisión pedida y hardware
+        
+        Con precisión 'fp16' se usa bf16 donde hay soporte nativo (CUDA
+        Ampere+, MPS en macOS 14+): misma memoria, sin desbordes en la
+        guidance. Pascal/Turing siguen en fp16.
+        """
+        if self.precision != 'fp16':
+            return torch.float32
+        
+        if self.device == 'cuda':
+            if torch.cuda.get_device_capability() >= (8, 0) and torch.cuda.is_bf16_supported():
+                return torch.bfloat16
+        elif self.device == 'mps':
+            mps = torch.backends.mps
+            if hasattr(mps, 'is_macos_or_newer') and mps.is_macos_or_newer(14, 0):
+                return torch.bfloat16
+        
+        return torch.float16
+    
+    def load_models(self, fast_mode=False):
+        """
+        Carga los modelos de IA (o reutiliza los de otra instancia)
+        
+        Args:
+            fast_mode: Fusiona la LoRA LCM y usa LCMScheduler (4 pasos, sin
+                guidance). Requiere diffusers con LCMScheduler (>= 0.22)
+        """
+        if self.pipe is not None and self.fast_mode == fast_mode:
+            return
+        
+        from diffusers import StableDiffusionControlNetPipeline
+        
+        if fast_mode:
+            try:
+                from diffusers import LCMScheduler  # noqa: F401
+            except ImportError:
+                print("⚠️  LCMScheduler no disponible en esta versión de diffusers; modo rápido desactivado")
+                fast_mode = False
+        self.fast_mode = fast_mode
+        
+        settings = self.hardware_profile['recommended_settings']
+        key = (
+            CONTROLNET_MODEL_ID, SD_MODEL_ID, self.precision, self.device,
+            bool(settings.get('cpu_offload')), fast_mode,
+            settings.get('quantize', 'none') or 'none'
+        )
+        
+        cached = RenderGenerator._MODEL_CACHE.get(key)
+        if cached is not None:
+            # Pesos compartidos (solo lectura en inferencia); scheduler propio
+            print("♻️ Reutilizando modelos ya cargados")
+            components = dict(cached.components)
+            components['scheduler'] = type(cached.scheduler).from_config(cached.scheduler.config)
+            self.pipe = StableDiffusionControlNetPipeline(**components, requires_safety_checker=False)
+        else:
+            print("📥 Cargando modelos de IA...")
+            compiled = self._build_pipeline(settings)
+            RenderGenerator._MODEL_CACHE[key] = self.pipe
+            
+            # La compilación se paga aquí y no en el primer render del usuario
+            if compiled:
+                self._warmup(settings.get('resolution', 512))
+                RenderGenerator._WARMED_UP.add(key)
+        
+        self.warmed_up = key in RenderGenerator._WARMED_UP
+        
+        self._generator = torch.Generator(device=self.device)
+        
+        # Stream propio para las subidas H2D (mapa de control / entrada en GPU)
+        if self.device == 'cuda' and self._upload_stream is None:
+            self._upload_stream = torch.cuda.Stream()
+        
+        # La cola fija del prompt se tokeniza una sola vez
+        self._suffix_ids = self.pipe.tokenizer(PROMPT_SUFFIX, add_special_tokens=False).input_ids
+        
+        # El negative prompt es constante: se codifica una sola vez por carga
+        with torch.no_grad():
+            self._negative_embeds = self.pipe._encode_prompt(
+                NEGATIVE_PROMPT, self.pipe._execution_device, 1, False
+            )
+        
+        print("✅ Modelos cargados correctamente")
+    
+    def close(self):
+        """
+        Suelta el pipeline y libera la VRAM (recarga en caliente)
         
-    def load_models(self):
-        """Carga los modelos de IA"""
-        print("📥 Cargando modelos de IA...")
+        Los pesos se comparten vía _MODEL_CACHE: la entrada que usa los mismos
+        modelos se elimina para que la memoria se libere de verdad cuando no
+        quede ningún generador que los use.
+        """
+        if self.pipe is None:
+            return
+        
+        unet = self.pipe.unet
+        for key, pipe in list(RenderGenerator._MODEL_CACHE.items()):
+            if pipe.unet is unet:
+                del RenderGenerator._MODEL_CACHE[key]
+        for key, generator in list(_GENERATORS.items()):
+            if generator is self:
+                del _GENERATORS[key]
+        
+        self.pipe = None
+        self._negative_embeds = None
+        del unet
+        
+        gc.collect()
+        if self.device == 'cuda':
+            torch.cuda.empty_cache()
+    
+    def _build_pipeline(self, settings):
+        """
+        Descarga/carga ControlNet + SD 1.5 y aplica las optimizaciones de hardware
+        
+        Returns:
+            True si UNet/ControlNet quedaron compiladas con torch.compile
+        """
+        from diffusers import StableDiffusionControlNetPipeline, ControlNetModel
         
         # Modelo ControlNet
         controlnet = ControlNetModel.from_pretrained(
-            "lllyasviel/control_v11p_sd15_canny",
-            torch_dtype=torch.float16 if self.precision == 'fp16' else torch.float32
+            _local_snapshot(CONTROLNET_MODEL_ID),
+            torch_dtype=self.torch_dtype
         )
         
         # Pipeline Stable Diffusion + ControlNet
         self.pipe = StableDiffusionControlNetPipeline.from_pretrained(
-            "runwayml/stable-diffusion-v1-5",
+            _local_snapshot(SD_MODEL_ID),
             controlnet=controlnet,
-            torch_dtype=torch.float16 if self.precision == 'fp16' else torch.float32,
+            torch_dtype=self.torch_dtype,
             safety_checker=None
         )
         
+        # LoRA LCM fusionada en los pesos: sin coste por paso, compatible con compile
+        if self.fast_mode:
+            self.pipe.load_lora_weights(LCM_LORA_ID)
+            self.pipe.fuse_lora()
+        
+        # Con offload los hooks de accelerate colocan cada modelo en la GPU al
+        # usarlo; un .to(device) previo cargaría todo en VRAM de golpe.
+        # Solo CUDA: en MPS la memoria es unificada y el offload no ahorra nada
+        offload = bool(settings.get('cpu_offload')) and self.device == 'cuda'
+        
         # Mover al dispositivo correcto
-        self.pipe = self.pipe.to(self.device)
+        if not offload:
+            self.pipe = self.pipe.to(self.device)
         
-        # Optimizaciones según hardware
-        settings = self.hardware_profile['recommended_settings']
+        # NHWC en CUDA fp16/bf16: cuDNN elige kernels implicit-GEMM de tensor cores
+        if self.device == 'cuda' and self.torch_dtype != torch.float32:
+            for module in (self.pipe.unet, self.pipe.vae, self.pipe.controlnet):
+                module.to(memory_format=torch.channels_last)
+        
+        # Optimizaciones según hardware.
+        # En CUDA la atención eficiente (xFormers/SDPA) sustituye al slicing:
+        # misma memoria O(N) sin serializar la atención fila a fila
+        efficient_attention = self.device == 'cuda' and self._enable_efficient_attention()
         
-        if settings.get('enable_attention_slicing'):
+        if settings.get('enable_attention_slicing') and not efficient_attention:
             self.pipe.enable_attention_slicing(1)
         
         if settings.get('enable_vae_slicing'):
             self.pipe.enable_vae_slicing()
         
-        if settings.get('cpu_offload') and self.device != 'cpu':
-            self.pipe.enable_sequential_cpu_offload()
+        self._quantize_models(settings)
         
-        # Scheduler
-        self.pipe.scheduler = DDIMScheduler.from_config(self.pipe.scheduler.config)
+        # Offload por modelo (text encoder / UNet / VAE completos en cada frontera)
+        # en vez de por submódulo: unas pocas copias por render, no cientos por paso
+        if offload:
+            self.pipe.enable_model_cpu_offload()
         
-        print("✅ Modelos cargados correctamente")
+        # Scheduler: DPM-Solver++ (orden 2, sigmas Karras) converge en ~8 pasos
+        # donde DDIM necesitaba 20; en modo rápido, LCM en 4
+        if self.fast_mode:
+            from diffusers import LCMScheduler
+            self.pipe.scheduler = LCMScheduler.from_config(self.pipe.scheduler.config)
+        else:
+            from diffusers import DPMSolverMultistepScheduler
+            self.pipe.scheduler = DPMSolverMultistepScheduler.from_config(
+                self.pipe.scheduler.config,
+                algorithm_type='dpmsolver++',
+                use_karras_sigmas=True,
+                solver_order=2
+            )
+        
+        return self._compile_models(settings)
+    
+    def _quantize_models(self, settings):
+        """
+        Reduce el ancho de los pesos de UNet y ControlNet según el hardware
+        
+        - CUDA sm_89+ (Ada/Hopper): FP8 con torchao (activaciones dinámicas,
+          escala por fila) u optimum-quanto (solo pesos) si no hay torchao
+        - CUDA sm_80-sm_86 (Ampere, sin tensor cores FP8): int8 solo pesos (torchao)
+        - CPU: int8 dinámico en las capas Linear
+        
+        `settings['quantize']`: 'none' (por defecto), 'auto', 'fp8' o 'int8'.
+        Es opcional: cambia la calidad numérica, así que hay que pedirlo.
+        Se ejecuta antes de torch.compile, que fusiona la (de)cuantización.
+        La VAE no se toca: es numéricamente sensible.
+        """
+        mode = settings.get('quantize', 'none') or 'none'
+        if mode == 'none':
+            return
+        
+        modules = ('unet', 'controlnet')
+        
+        if self.device == 'cpu':
+            for name in modules:
+                setattr(self.pipe, name, torch.quantization.quantize_dynamic(
+                    getattr(self.pipe, name), {torch.nn.Linear}, dtype=torch.qint8
+                ))
+            print("   ⚡ UNet y ControlNet cuantizadas a int8 (dinámico)")
+            return
+        
+        if self.device != 'cuda':
+            return
+        
+        capability = torch.cuda.get_device_capability()
+        if mode == 'auto':
+            if capability >= (8, 9):
+                mode = 'fp8'
+            elif capability >= (8, 0):
+                mode = 'int8'
+            else:
+                return
+        
+        try:
+            from torchao.quantization import (
+                quantize_, float8_dynamic_activation_float8_weight, int8_weight_only, PerRow
+            )
+        except ImportError:
+            quantize_ = None
+        
+        if mode == 'fp8' and capability >= (8, 9):
+            if quantize_ is not None:
+                config = float8_dynamic_activation_float8_weight(granularity=PerRow())
+                for name in modules:
+                    quantize_(getattr(self.pipe, name), config)
+            else:
+                try:
+                    from optimum.quanto import quantize, freeze, qfloat8
+                except ImportError:
+                    return
+                for name in modules:
+                    quantize(getattr(self.pipe, name), weights=qfloat8)
+                    freeze(getattr(self.pipe, name))
+            print("   ⚡ UNet y ControlNet cuantizadas a FP8")
+        
+        elif mode == 'int8' and quantize_ is not None:
+            for name in modules:
+                quantize_(getattr(self.pipe, name), int8_weight_only())
+            print("   ⚡ UNet y ControlNet cuantizadas a int8 (solo pesos)")
+    
+    def _compile_models(self, settings):
+        """
+        Compila UNet y ControlNet con torch.compile (fusión de kernels + CUDA graphs)
+        
+        Solo en CUDA sin CPU offload y si `enable_compile` (por defecto True):
+        los hooks del offload mueven pesos entre dispositivos en cada forward,
+        lo que invalida los CUDA graphs capturados.
+        El primer generate() de cada resolución paga la compilación (60-120 s
+        la primera vez); las siguientes reutilizan los kernels. La caché de
+        Inductor se guarda en disco, así que los arranques posteriores la leen.
+        
+        Returns:
+            True si se compiló
+        """
+        if self.device != 'cuda' or settings.get('cpu_offload') or not hasattr(torch, 'compile'):
+            return False
+        
+        if not settings.get('enable_compile', True):
+            return False
+        
+        # Un grafo por bucket y resolución: que dynamo no los descarte
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, 64)
+        
+        # Grafos FX compilados también en disco (TORCHINDUCTOR_CACHE_DIR)
+        if hasattr(torch._inductor.config, 'fx_graph_cache'):
+            torch._inductor.config.fx_graph_cache = True
+        
+        # 'reduce-overhead' captura CUDA graphs: un launch por paso de denoising
+        self.pipe.unet = torch.compile(self.pipe.unet, mode='reduce-overhead', dynamic=False)
+        self.pipe.controlnet = torch.compile(self.pipe.controlnet, mode='reduce-overhead', dynamic=False)
+        print("   ⚡ UNet y ControlNet compiladas con torch.compile")
+        return True
+    
+    def _warmup(self, resolution):
+        """Render descartable de 1 paso que dispara la compilación del bucket 1:1"""
+        print("   🔥 Precalentando kernels compilados...")
+        size = _bucket_size(resolution, resolution, resolution)
+        blank = torch.zeros((1, 3, size[1], size[0]), device=self.device)
+        with torch.no_grad():
+            self.pipe(prompt="", image=blank, num_inference_steps=1, output_type='latent')
+    
+    def _enable_efficient_attention(self):
+        """
+        Activa atención memory-efficient: xFormers o, si no está, SDPA de PyTorch 2
+        
+        Returns:
+            True si alguno de los dos quedó activo
+        """
+        try:
+            self.pipe.enable_xformers_memory_efficient_attention()
+            print("   ⚡ Atención xFormers activada")
+            return True
+        except Exception:
+            pass
+        
+        try:
+            from diffusers.models.attention_processor import AttnProcessor2_0
+            self.pipe.unet.set_attn_processor(AttnProcessor2_0())
+            self.pipe.controlnet.set_attn_processor(AttnProcessor2_0())
+            print("   ⚡ Atención SDPA (PyTorch 2) activada")
+            return True
+        except ImportError:
+            return False
+    
+    def _load_gray_gpu(self, image):
+        """
+        Sube la entrada a la GPU en escala de grises, sin redimensionar en CPU
+        
+        Los paths se decodifican con torchvision directamente a un canal; las
+        PIL Image se convierten a 'L' y se suben tal cual.
+        
+        Returns:
+            Tensor (1, 1, H, W) en [0, 1] en el dispositivo del pipeline
+        """
+        gray = None
+        if isinstance(image, str):
+            try:
+                from torchvision.io import read_image, ImageReadMode
+                gray = read_image(image, ImageReadMode.GRAY)
+            except (ImportError, RuntimeError):
+                image = Image.open(image)
+        
+        if gray is None:
+            gray = torch.from_numpy(np.array(image.convert('L')))[None]
+        
+        # Pinned: la copia a la GPU es realmente asíncrona (DMA, sin bounce buffer)
+        gray = self._upload(gray.pin_memory())
+        return gray[None].float().div_(255.0)
+    
+    def _canny_gpu(self, gray, low_threshold=100, high_threshold=200):
+        """
+        Detecta bordes Canny en GPU con kornia
+        
+        Args:
+            gray: Tensor (1, 1, H, W) en [0, 1] ya en la GPU
+        
+        Returns:
+            Tensor (1, 3, H, W) en [0, 1], ya en el dispositivo del pipeline
+        """
+        _, edges = kornia.filters.canny(
+            gray,
+            low_threshold=low_threshold / 255.0,
+            high_threshold=high_threshold / 255.0,
+            sigma=(1.0, 1.0)
+        )
+        return edges.expand(-1, 3, -1, -1)
+    
+    def _prompt_prefix(
+        self,
+        material_prompt,
+        style_preset=DEFAULT_STYLE_PRESET,
+        lighting_profile=DEFAULT_LIGHTING_PROFILE,
+        custom_lighting="",
+        **_
+    ):
+        """Parte variable del prompt (materiales + iluminación + estilo)"""
+        lighting_prompt = self.lighting_controller.build_lighting_prompt(
+            lighting_profile,
+            custom_additions=custom_lighting
+        )
+        return f"{material_prompt}, {lighting_prompt}, {style_preset}"
+    
+    def _encode_prompt(self, prompt_prefix):
+        """Codifica un único prefijo (ver _encode_prompts)"""
+        return self._encode_prompts([prompt_prefix])
+    
+    def _encode_prompts(self, prompt_prefixes):
+        """
+        Codifica prefijos variables + PROMPT_SUFFIX en una sola pasada de CLIP
+        
+        Solo se tokeniza el prefijo; los ids de la cola vienen de load_models.
+        CLIP tokeniza palabra a palabra, así que el resultado es idéntico al
+        de tokenizar el prompt completo (mismo truncado a 77 tokens).
+        
+        Returns:
+            Tensor (N, 77, dim) con un embedding por prefijo
+        """
+        tokenizer = self.pipe.tokenizer
+        max_length = tokenizer.model_max_length
+        
+        batch = []
+        for prefix_ids in tokenizer(list(prompt_prefixes), add_special_tokens=False).input_ids:
+            body = (prefix_ids + self._suffix_ids)[:max_length - 2]
+            ids = [tokenizer.bos_token_id] + body + [tokenizer.eos_token_id]
+            ids += [tokenizer.pad_token_id] * (max_length - len(ids))
+            batch.append(ids)
+        
+        input_ids = torch.tensor(batch, device=self.pipe._execution_device)
+        return self.pipe.text_encoder(input_ids)[0]
+    
+    def _maybe_release_cache(self, high_water=0.9):
+        """
+        Libera la caché del allocator CUDA solo cerca del límite de VRAM
+        
+        Vaciarla en cada render obliga a repetir cudaMalloc en el siguiente;
+        solo compensa cuando lo reservado supera `high_water` del total.
+        """
+        if self.device != 'cuda':
+            return
+        
+        total = torch.cuda.mem_get_info()[1]
+        if torch.cuda.memory_reserved() > high_water * total:
+            gc.collect()
+            torch.cuda.empty_cache()
+    
+    def _pad_to_bucket(self, control, bucket_size):
+        """
+        Centra el mapa de control en un lienzo del tamaño del bucket
+        
+        Returns:
+            (mapa rellenado, caja (left, top, right, bottom) del contenido)
+        """
+        if isinstance(control, torch.Tensor):
+            width, height = control.shape[-1], control.shape[-2]
+        else:
+            width, height = control.size
+        
+        left = (bucket_size[0] - width) // 2
+        top = (bucket_size[1] - height) // 2
+        content_box = (left, top, left + width, top + height)
+        
+        if (width, height) == bucket_size:
+            return control, content_box
+        
+        if isinstance(control, torch.Tensor):
+            padded = torch.nn.functional.pad(
+                control,
+                (left, bucket_size[0] - width - left, top, bucket_size[1] - height - top)
+            )
+        else:
+            padded = Image.new(control.mode, bucket_size)
+            padded.paste(control, (left, top))
+        
+        return padded, content_box
+    
+    def _detect_edges(self, image):
+        """
+        Calcula el mapa de control
+        
+        Args:
+            image: PIL Image (CPU) o tensor gris (1, 1, H, W) en GPU
+        
+        Returns:
+            (entrada para el pipeline, PIL Image para guardar/mostrar)
+        """
+        if isinstance(image, torch.Tensor):
+            edges = self._canny_gpu(image)
+            edges_uint8 = edges[0, 0].mul(255).byte().cpu().numpy()
+            return edges, Image.fromarray(edges_uint8)
+        
+        control_image = self.edge_detector(image, return_mode='L')
+        return self._edges_to_tensor(control_image), control_image
+    
+    def _upload(self, pinned):
+        """
+        Copia asíncrona pinned -> GPU por el stream de subidas
+        
+        El stream por defecto (UNet) espera a la copia antes de leer el tensor,
+        y record_stream evita que el allocator recicle la memoria antes de tiempo.
+        """
+        with torch.cuda.stream(self._upload_stream):
+            uploaded = pinned.to(self.device, non_blocking=True)
+        
+        torch.cuda.current_stream().wait_stream(self._upload_stream)
+        uploaded.record_stream(torch.cuda.current_stream())
+        return uploaded
+    
+    def _edges_to_tensor(self, control_image):
+        """
+        Mapa de bordes PIL -> tensor (1, 3, H, W) en [0, 1]
+        
+        Se convierte un único canal y los 3 canales que espera ControlNet
+        son una vista (expand), sin triplicar memoria.
+        
+        En CUDA el uint8 se sube desde un buffer pinned por un stream propio
+        (copia asíncrona) y la normalización se hace ya en la GPU.
+        """
+        if control_image.mode != 'L':
+            control_image = control_image.convert('L')
+        
+        if self.device != 'cuda':
+            edges = torch.from_numpy(np.array(control_image))
+            return edges[None, None].float().div_(255).expand(-1, 3, -1, -1)
+        
+        width, height = control_image.size
+        with self._staging_lock:
+            if self._pinned_edges is None or self._pinned_edges.numel() < width * height:
+                self._pinned_edges = torch.empty(width * height, dtype=torch.uint8, pin_memory=True)
+            
+            # El buffer se reutiliza: esperar a que termine la subida anterior
+            self._upload_stream.synchronize()
+            staging = self._pinned_edges[:width * height].view(height, width)
+            staging.numpy()[...] = np.asarray(control_image)
+            
+            edges = self._upload(staging)
+        
+        return edges[None, None].float().div_(255).expand(-1, 3, -1, -1)
+    
+    def _prepare_control(self, input_image, resolution):
+        """
+        Redimensiona la entrada al bucket y calcula su mapa de control
+        
+        Solo depende de la imagen y la resolución: varias configuraciones con
+        la misma resolución pueden compartir el resultado.
+        
+        Returns:
+            (new_size, bucket_size, control_input, control_image, content_box)
+        """
+        if self.use_gpu_edges:
+            # Todo el preprocesado en GPU: una sola subida, sin resize en CPU
+            input_image = self._load_gray_gpu(input_image)
+            height, width = input_image.shape[-2:]
+        else:
+            # Cargar imagen si es path
+            if isinstance(input_image, str):
+                input_image = Image.open(input_image)
+            width, height = input_image.size
+        
+        # Bucket de resolución: pocos shapes fijos para no recompilar la UNet
+        bucket_size = _bucket_size(width, height, resolution)
+        
+        # Redimensionar manteniendo aspecto dentro del bucket
+        scale = min(bucket_size[0] / width, bucket_size[1] / height)
+        
+        # Ajustar a múltiplos de 8 (máscara & ~7, sin ramas)
+        new_size = (int(width * scale) & ~7, int(height * scale) & ~7)
+        
+        if self.use_gpu_edges:
+            input_image = torch.nn.functional.interpolate(
+                input_image, size=(new_size[1], new_size[0]),
+                mode='bilinear', align_corners=False, antialias=True
+            )
+        else:
+            input_image = _resize(input_image, new_size)
+        
+        # Detectar bordes
+        control_input, control_image = self._detect_edges(input_image)
+        
+        # Letterbox del mapa de control hasta el bucket (negro = sin bordes)
+        control_input, content_box = self._pad_to_bucket(control_input, bucket_size)
+        
+        return new_size, bucket_size, control_input, control_image, content_box
     
     def generate(
         self,
         input_image,
         material_prompt,
-        style_preset="Fotografía de Interiores Profesional",
-        lighting_profile="natural_morning",
+        style_preset=DEFAULT_STYLE_PRESET,
+        lighting_profile=DEFAULT_LIGHTING_PROFILE,
         custom_lighting="",
         resolution=512,
-        steps=20,
+        steps=8,
         guidance_scale=7.0,
         control_strength=0.85,
         seed=None,
+        prompt_embeds=None,
+        progress_callback=None,
+        _precomputed_control=None,
         **kwargs
     ):
         """
@@ -106,10 +888,13 @@ class RenderGenerator:
             lighting_profile: Perfil de iluminación
             custom_lighting: Modificadores adicionales
             resolution: Resolución de salida
-            steps: Pasos de inferencia
-            guidance_scale: Escala de guidance
+            steps: Pasos de inferencia (en modo rápido siempre LCM_STEPS)
+            guidance_scale: Escala de guidance (en modo rápido 1.0)
             control_strength: Fidelidad geométrica
             seed: Semilla aleatoria (None = aleatorio)
+            prompt_embeds: Embedding ya codificado del prompt (omite CLIP)
+            progress_callback: callable(paso, total) tras cada paso de difusión
+            _precomputed_control: Resultado de _prepare_control (uso interno)
             
         Returns:
             dict con 'image', 'control_image', 'metadata'
@@ -117,61 +902,75 @@ class RenderGenerator:
         if self.pipe is None:
             raise RuntimeError("Debes cargar los modelos primero con load_models()")
         
-        # Cargar imagen si es path
-        if isinstance(input_image, str):
-            input_image = Image.open(input_image)
+        # LCM está destilado para pocos pasos y sin classifier-free guidance
+        if self.fast_mode:
+            steps, guidance_scale = LCM_STEPS, 1.0
         
-        # Redimensionar manteniendo aspecto
-        aspect = input_image.width / input_image.height
-        if aspect > 1:
-            new_size = (resolution, int(resolution / aspect))
+        if _precomputed_control is not None:
+            new_size, bucket_size, control_input, control_image, content_box = _precomputed_control
         else:
-            new_size = (int(resolution * aspect), resolution)
-        
-        # Ajustar a múltiplos de 8
-        new_size = (
-            (new_size[0] // 8) * 8,
-            (new_size[1] // 8) * 8
-        )
-        
-        input_image = input_image.resize(new_size, Image.Resampling.LANCZOS)
-        
-        # Detectar bordes
-        control_image = self.edge_detector(input_image)
-        
-        # Construir prompt
-        lighting_prompt = self.lighting_controller.build_lighting_prompt(
-            lighting_profile,
-            custom_additions=custom_lighting
-        )
-        
-        full_prompt = f"{material_prompt}, {lighting_prompt}, {style_preset}, photorealistic, 4k, sharp focus, architectural photography"
+            new_size, bucket_size, control_input, control_image, content_box = self._prepare_control(
+                input_image, resolution
+            )
         
-        negative_prompt = "cartoon, 3d render, painting, illustration, anime, sketch, blurry, ugly, distorted, low quality, watermark, text, oversaturated, underexposed, overexposed, bad lighting"
-        
-        # Seed
-        if seed is not None:
-            generator = torch.Generator(device=self.device).manual_seed(seed)
-        else:
-            generator = None
+        step_callback = None
+        if progress_callback is not None:
+            step_callback = lambda i, t, latents: progress_callback(i + 1, steps)
         
         # Generar
-        with torch.no_grad():
+        with self._pipe_lock, torch.no_grad(), self._attention_context():
+            # Seed: se reutiliza el mismo torch.Generator en lugar de crear uno por render
+            if seed is not None:
+                self._generator.manual_seed(seed)
+            else:
+                self._generator.seed()
+            
+            if prompt_embeds is None:
+                prompt_embeds = self._encode_prompt(self._prompt_prefix(
+                    material_prompt, style_preset, lighting_profile, custom_lighting
+                ))
             output = self.pipe(
-                prompt=full_prompt,
-                negative_prompt=negative_prompt,
-                image=control_image,
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=self._negative_embeds,
+                image=control_input,
                 num_inference_steps=steps,
                 guidance_scale=guidance_scale,
                 controlnet_conditioning_scale=control_strength,
-                generator=generator
+                generator=self._generator,
+                callback=step_callback,
+                callback_steps=1
             )
         
+        # Soltar los tensores de este render antes de decidir si liberar la caché
         result_image = output.images[0]
+        del output, control_input, prompt_embeds
+        self._maybe_release_cache()
+        
+        if result_image.size != new_size:
+            result_image = result_image.crop(content_box)
         
         # Metadata
-        metadata = {
+        metadata = self._render_metadata(
+            new_size, bucket_size, content_box, steps, guidance_scale, control_strength, seed,
+            material_prompt, style_preset, lighting_profile, custom_lighting
+        )
+        
+        return {
+            'image': result_image,
+            'control_image': control_image,
+            'metadata': metadata
+        }
+    
+    def _render_metadata(self, new_size, bucket_size, content_box, steps, guidance_scale,
+                         control_strength, seed, material_prompt,
+                         style_preset=DEFAULT_STYLE_PRESET,
+                         lighting_profile=DEFAULT_LIGHTING_PROFILE,
+                         custom_lighting=""):
+        """Metadata de un render (común a generate y _generate_batch)"""
+        return {
             'resolution': new_size,
+            'bucket': bucket_size,
+            'content_box': content_box,
             'steps': steps,
             'guidance_scale': guidance_scale,
             'control_strength': control_strength,
@@ -180,16 +979,81 @@ class RenderGenerator:
             'style_preset': style_preset,
             'lighting_profile': lighting_profile,
             'custom_lighting': custom_lighting,
-            'lighting_metadata': self.lighting_controller.get_profile_metadata(lighting_profile),
+            'lighting_metadata': self.lighting_controller.get_lighting_metadata(lighting_profile),
             'hardware_used': self.hardware_profile['category'],
             'device': self.device
         }
+    
+    def _generate_batch(self, params_list, prompt_embeds, precomputed_control):
+        """
+        Varias configuraciones en una sola llamada al pipeline
         
-        return {
-            'image': result_image,
-            'control_image': control_image,
-            'metadata': metadata
-        }
+        Requiere el mismo mapa de control y los mismos pasos/guidance/fuerza;
+        solo cambian prompt y semilla. El mapa de control se difunde al batch.
+        
+        Args:
+            params_list: Parámetros de cada configuración (como en generate)
+            prompt_embeds: Tensor (N, 77, dim), uno por configuración
+            precomputed_control: Resultado de _prepare_control
+            
+        Returns:
+            Lista de dicts con 'image', 'control_image', 'metadata'
+        """
+        new_size, bucket_size, control_input, control_image, content_box = precomputed_control
+        
+        first = params_list[0]
+        steps = first.get('steps', 8)
+        guidance_scale = first.get('guidance_scale', 7.0)
+        control_strength = first.get('control_strength', 0.85)
+        if self.fast_mode:
+            steps, guidance_scale = LCM_STEPS, 1.0
+        
+        n = len(params_list)
+        negative_embeds = None
+        if self._negative_embeds is not None:
+            negative_embeds = self._negative_embeds.expand(n, -1, -1)
+        
+        # Un torch.Generator por imagen: cada variación conserva su semilla
+        generators = []
+        for params in params_list:
+            generator = torch.Generator(device=self.device)
+            if params.get('seed') is not None:
+                generator.manual_seed(params['seed'])
+            else:
+                generator.seed()
+            generators.append(generator)
+        
+        with self._pipe_lock, torch.no_grad(), self._attention_context():
+            output = self.pipe(
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=negative_embeds,
+                image=control_input,
+                num_inference_steps=steps,
+                guidance_scale=guidance_scale,
+                controlnet_conditioning_scale=control_strength,
+                generator=generators
+            )
+        
+        images = output.images
+        del output, prompt_embeds, negative_embeds
+        self._maybe_release_cache()
+        
+        results = []
+        for image, params in zip(images, params_list):
+            if image.size != new_size:
+                image = image.crop(content_box)
+            results.append({
+                'image': image,
+                'control_image': control_image,
+                'metadata': self._render_metadata(
+                    new_size, bucket_size, content_box, steps, guidance_scale, control_strength,
+                    params.get('seed'), params.get('material_prompt', ''),
+                    params.get('style_preset', DEFAULT_STYLE_PRESET),
+                    params.get('lighting_profile', DEFAULT_LIGHTING_PROFILE),
+                    params.get('custom_lighting', "")
+                )
+            })
+        return results
     
     def generate_with_project_structure(
         self,
@@ -197,6 +1061,8 @@ class RenderGenerator:
         project_name=None,
         configurations=None,
         save_outputs=True,
+        batch=False,
+        progress_callback=None,
         **single_config_kwargs
     ):
         """
@@ -207,6 +1073,10 @@ class RenderGenerator:
             project_name: Nombre del proyecto (auto si None)
             configurations: Lista de configuraciones [{name, params}] o None
             save_outputs: Si False, solo retorna resultados sin guardar
+            batch: Generar en una sola llamada al pipeline las configuraciones que
+                solo difieren en prompt/semilla (más VRAM, menos overhead)
+            progress_callback: callable(índice, total, imagen) al completar cada render
+                (con batch, se llama para todas juntas al terminar la pasada única)
             **single_config_kwargs: Si no hay configs, usar estos params
             
         Returns:
@@ -215,9 +1085,9 @@ class RenderGenerator:
                 - results: Lista de resultados
                 - metadata: Metadata completa del proyecto
         """
-        from datetime import datetime
-        from pathlib import Path
-        import json
+        # Antes de crear carpetas o preparar el control (que usa los streams de CUDA)
+        if self.pipe is None:
+            raise RuntimeError("Debes cargar los modelos primero con load_models()")
         
         # Nombre del proyecto
         if project_name is None:
@@ -241,14 +1111,15 @@ class RenderGenerator:
             for folder in folders.values():
                 folder.mkdir(parents=True, exist_ok=True)
         
-        # Cargar imagen original
-        if isinstance(input_image, str):
+        # Cargar imagen original (si se abre aquí, se cierra al terminar)
+        opened_here = isinstance(input_image, str)
+        if opened_here:
             input_image = Image.open(input_image)
         
         # Guardar original
         if save_outputs:
             original_path = folders['original'] / 'original.jpg'
-            input_image.save(original_path, quality=95)
+            _save_jpeg(input_image, original_path, 95)
         
         # Si no hay configs, crear una con los kwargs
         if configurations is None:
@@ -271,9 +1142,43 @@ class RenderGenerator:
             'renders': []
         }
         
+        # Si todas las configuraciones comparten resolución, el resize y los
+        # bordes se calculan una sola vez (y la UNet compilada ve un único shape)
+        resolutions = {config.get('params', {}).get('resolution', 512) for config in configurations}
+        shared_control = None
+        if len(configurations) > 1 and len(resolutions) == 1:
+            shared_control = self._prepare_control(input_image, resolutions.pop())
+        
+        # Todos los prompts en un único batch de CLIP (los repetidos, una vez)
+        prefixes = [self._prompt_prefix(**config.get('params', {})) for config in configurations]
+        unique_prefixes = list(dict.fromkeys(prefixes))
+        with torch.no_grad():
+            unique_embeds = self._encode_prompts(unique_prefixes)
+        prefix_index = {prefix: i for i, prefix in enumerate(unique_prefixes)}
+        
         # Generar cada configuración
         import time
         
+        # Batch: mismo mapa de control y mismos pasos/guidance/fuerza -> una
+        # sola pasada de difusión para todas las configuraciones
+        batch_results = None
+        if batch and shared_control is not None:
+            sampling = {
+                (p.get('steps', 8), p.get('guidance_scale', 7.0), p.get('control_strength', 0.85))
+                for p in (config.get('params', {}) for config in configurations)
+            }
+            if len(sampling) == 1:
+                print(f"\n🎨 Generando {len(configurations)} configuraciones en un solo batch")
+                start_time = time.time()
+                order = torch.tensor([prefix_index[prefix] for prefix in prefixes], device=unique_embeds.device)
+                batch_results = self._generate_batch(
+                    [config.get('params', {}) for config in configurations],
+                    unique_embeds.index_select(0, order),
+                    shared_control
+                )
+                batch_time = (time.time() - start_time) / len(configurations)
+        
+        pending = []
         for i, config in enumerate(configurations):
             config_name = config.get('name', f'render_{i+1}')
             config_desc = config.get('description', config_name)
@@ -282,32 +1187,33 @@ class RenderGenerator:
             print(f"\n🎨 Generando: {config_name}")
             print(f"   {config_desc}")
             
-            start_time = time.time()
-            
-            # Generar
-            result = self.generate(input_image=input_image, **params)
-            
-            generation_time = time.time() - start_time
+            if batch_results is not None:
+                result = batch_results[i]
+                generation_time = batch_time
+            else:
+                start_time = time.time()
+                
+                # Generar
+                j = prefix_index[prefixes[i]]
+                result = self.generate(
+                    input_image=input_image,
+                    prompt_embeds=unique_embeds[j:j + 1],
+                    _precomputed_control=shared_control,
+                    **params
+                )
+                
+                generation_time = time.time() - start_time
             
             if save_outputs:
-                # Guardar render
                 render_path = folders['renders'] / f"{config_name}.jpg"
-                result['image'].save(render_path, quality=95)
-                
-                # Guardar control
                 control_path = folders['controls'] / f"{config_name}_control.jpg"
-                result['control_image'].save(control_path, quality=90)
-                
-                # Crear comparativa
                 comparative_path = folders['comparatives'] / f"{config_name}_comparative.jpg"
-                self._create_comparative(
-                    input_image,
-                    result['image'],
-                    result['control_image'],
-                    comparative_path,
-                    config_name,
-                    config_desc
-                )
+                
+                args = (input_image, result, render_path, control_path, comparative_path, config_name, config_desc)
+                if self._io_pool is not None:
+                    pending.append(self._io_pool.submit(self._persist_artifacts, *args))
+                else:
+                    self._persist_artifacts(*args)
             
             # Metadata del render
             render_meta = {
@@ -334,14 +1240,22 @@ class RenderGenerator:
             })
             
             print(f"   ✅ Completado en {generation_time:.1f}s")
+            
+            if progress_callback is not None:
+                progress_callback(i, len(configurations), result['image'])
+        
+        # El mapa de control compartido y los embeddings ya no se usan: fuera de VRAM
+        shared_control = unique_embeds = batch_results = None
         
         if save_outputs:
+            # Esperar a los guardados en segundo plano (y propagar sus errores)
+            wait(pending)
+            for future in pending:
+                future.result()
+            
             # Guardar metadata JSON
             metadata_path = base_path / 'project_metadata.json'
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                # Convertir paths a strings para JSON
-                json_metadata = json.loads(json.dumps(metadata, default=str))
-                json.dump(json_metadata, f, indent=2, ensure_ascii=False)
+            self._write_metadata(metadata_path, metadata)
             
             # Crear resumen TXT
             self._create_summary(base_path, metadata)
@@ -352,126 +1266,185 @@ class RenderGenerator:
             
             print(f"\n✅ Proyecto guardado: {base_path}")
         
+        if opened_here:
+            input_image.close()
+        
         return {
             'project_path': str(base_path) if save_outputs else None,
             'results': results,
             'metadata': metadata
         }
     
+    def _write_metadata(self, metadata_path, metadata):
+        """
+        Escribe la metadata en JSON (indentado, UTF-8)
+        
+        Lo no serializable (Path, etc.) se convierte con str en la misma
+        pasada; orjson además serializa enteros/arrays de numpy.
+        """
+        if orjson is not None:
+            metadata_path.write_bytes(orjson.dumps(
+                metadata,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+                default=str
+            ))
+            return
+        
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False, default=str)
+    
+    def _persist_artifacts(self, input_image, result, render_path, control_path,
+                           comparative_path, config_name, config_desc):
+        """Guarda render, mapa de control y comparativa de una configuración"""
+        _save_jpeg(result['image'], render_path, 95)
+        _save_jpeg(result['control_image'], control_path, 90)
+        self._create_comparative(
+            input_image,
+            result['image'],
+            result['control_image'],
+            comparative_path,
+            config_name,
+            config_desc
+        )
+    
     def _create_comparative(self, original, render, control, save_path, title, description=""):
-        """Crea imagen comparativa antes/después"""
-        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
+        """
+        Crea imagen comparativa antes/después
         
-        axes[0].imshow(original)
-        axes[0].set_title('ORIGINAL\n(Render 3D)', fontsize=12, fontweight='bold')
-        axes[0].axis('off')
+        Las tres imágenes se pegan lado a lado al alto del render sobre un
+        lienzo Pillow, con una banda de título arriba.
+        """
+        height = render.height
+        panels = [
+            _fit_height(original.convert('RGB'), height),
+            _fit_height(control.convert('RGB'), height),
+            render.convert('RGB')
+        ]
         
-        axes[1].imshow(control)
-        axes[1].set_title('GEOMETRÍA\n(Edge Detection)', fontsize=12)
-        axes[1].axis('off')
+        top = _TITLE_HEIGHT + _LABEL_HEIGHT
+        canvas = Image.new('RGB', (sum(p.width for p in panels), top + height), 'white')
+        draw = ImageDraw.Draw(canvas)
         
-        axes[2].imshow(render)
-        axes[2].set_title('FOTORREALISTA\n(IA Generated)', fontsize=12, fontweight='bold', color='green')
-        axes[2].axis('off')
+        heading = f"{title}\n{description}" if description else title
+        _draw_centered(draw, (canvas.width // 2, _TITLE_HEIGHT // 2), heading, _font(18, bold=True))
         
-        if description:
-            plt.suptitle(f'{title}\n{description}', fontsize=14, y=0.98)
-        else:
-            plt.suptitle(title, fontsize=14, y=0.98)
+        x = 0
+        for panel, (label, color) in zip(panels, _PANEL_LABELS):
+            canvas.paste(panel, (x, top))
+            _draw_centered(
+                draw, (x + panel.width // 2, _TITLE_HEIGHT + _LABEL_HEIGHT // 2),
+                label, _font(14, bold=True), fill=color
+            )
+            x += panel.width
         
-        plt.tight_layout()
-        plt.savefig(save_path, dpi=150, bbox_inches='tight', facecolor='white')
-        plt.close()
+        _save_jpeg(canvas, save_path, 90)
     
     def _create_summary(self, base_path, metadata):
-        """Crea archivo README con resumen del proyecto"""
+        """Crea archivo README con resumen del proyecto (una sola escritura)"""
         summary_path = base_path / 'README.txt'
+        hardware = metadata['hardware']
+        width, height = metadata['original_size']
+        
+        parts = [
+            _SEP,
+            "PROYECTO: RENDERS FOTORREALISTAS - INTERIOR AI RENDER\n",
+            _SEP, "\n",
+            f"Nombre del proyecto: {metadata['project_name']}\n",
+            f"Fecha de creación: {metadata['created_at']}\n",
+            f"Resolución original: {width}x{height}px\n",
+            f"Total de renders: {len(metadata['renders'])}\n\n",
+            "Hardware utilizado:\n",
+            f"  • Categoría: {hardware['category']}\n",
+            f"  • Tier: {hardware['tier']}\n",
+            f"  • GPU: {hardware['gpu']}\n\n",
+            _STRUCTURE_SECTION,
+        ]
+        if len(metadata['renders']) > 1:
+            parts.append("📄 GALLERY.jpg        → Galería con todas las comparativas\n")
+        parts += ["\n", _SEP, "RENDERS GENERADOS\n", _SEP, "\n"]
+        
+        total_time = 0
+        for i, render in enumerate(metadata['renders'], 1):
+            config = render['config']
+            render_meta = render['render_metadata']
+            resolution = render_meta['resolution']
+            parts.append(
+                f"{i}. {render['name']}\n"
+                f"   Descripción: {render.get('description', 'N/A')}\n"
+                f"   Materiales: {config.get('material_prompt', 'N/A')[:70]}...\n"
+                f"   Iluminación: {config.get('lighting_profile', 'N/A')}\n"
+                f"   Estilo: {config.get('style_preset', 'N/A')}\n"
+                f"   Resolución: {resolution[0]}x{resolution[1]}px\n"
+                f"   Pasos: {render_meta['steps']}\n"
+                f"   Fidelidad geométrica: {render_meta['control_strength']}\n"
+                f"   Tiempo de generación: {render['generation_time_seconds']:.1f} segundos\n\n"
+            )
+            total_time += render['generation_time_seconds']
+        
+        parts += [
+            _SEP,
+            f"Tiempo total de generación: {total_time:.1f} segundos ({total_time/60:.1f} minutos)\n",
+            _SEP, "\n",
+            "Generado por Interior AI Render MVP\n",
+            "Sistema de IA para generación de renders fotorrealistas\n",
+        ]
         
         with open(summary_path, 'w', encoding='utf-8') as f:
-            f.write("="*70 + "\n")
-            f.write("PROYECTO: RENDERS FOTORREALISTAS - INTERIOR AI RENDER\n")
-            f.write("="*70 + "\n\n")
-            
-            f.write(f"Nombre del proyecto: {metadata['project_name']}\n")
-            f.write(f"Fecha de creación: {metadata['created_at']}\n")
-            f.write(f"Resolución original: {metadata['original_size'][0]}x{metadata['original_size'][1]}px\n")
-            f.write(f"Total de renders: {len(metadata['renders'])}\n\n")
-            
-            f.write(f"Hardware utilizado:\n")
-            f.write(f"  • Categoría: {metadata['hardware']['category']}\n")
-            f.write(f"  • Tier: {metadata['hardware']['tier']}\n")
-            f.write(f"  • GPU: {metadata['hardware']['gpu']}\n\n")
-            
-            f.write("="*70 + "\n")
-            f.write("ESTRUCTURA DEL PROYECTO\n")
-            f.write("="*70 + "\n\n")
-            
-            f.write("📁 original/          → Tu render 3D original\n")
-            f.write("📁 renders/           → Renders fotorrealistas generados\n")
-            f.write("📁 controls/          → Mapas de geometría (edge detection)\n")
-            f.write("📁 comparatives/      → Comparativas antes/después\n")
-            f.write("📄 project_metadata.json → Metadata técnica completa (JSON)\n")
-            f.write("📄 README.txt         → Este archivo\n")
-            if len(metadata['renders']) > 1:
-                f.write("📄 GALLERY.jpg        → Galería con todas las comparativas\n")
-            f.write("\n")
-            
-            f.write("="*70 + "\n")
-            f.write("RENDERS GENERADOS\n")
-            f.write("="*70 + "\n\n")
-            
-            total_time = 0
-            for i, render in enumerate(metadata['renders'], 1):
-                f.write(f"{i}. {render['name']}\n")
-                f.write(f"   Descripción: {render.get('description', 'N/A')}\n")
-                
-                config = render['config']
-                f.write(f"   Materiales: {config.get('material_prompt', 'N/A')[:70]}...\n")
-                f.write(f"   Iluminación: {config.get('lighting_profile', 'N/A')}\n")
-                f.write(f"   Estilo: {config.get('style_preset', 'N/A')}\n")
-                
-                render_meta = render['render_metadata']
-                f.write(f"   Resolución: {render_meta['resolution'][0]}x{render_meta['resolution'][1]}px\n")
-                f.write(f"   Pasos: {render_meta['steps']}\n")
-                f.write(f"   Fidelidad geométrica: {render_meta['control_strength']}\n")
-                f.write(f"   Tiempo de generación: {render['generation_time_seconds']:.1f} segundos\n")
-                
-                total_time += render['generation_time_seconds']
-                f.write("\n")
-            
-            f.write("="*70 + "\n")
-            f.write(f"Tiempo total de generación: {total_time:.1f} segundos ({total_time/60:.1f} minutos)\n")
-            f.write("="*70 + "\n\n")
-            
-            f.write("Generado por Interior AI Render MVP\n")
-            f.write("Sistema de IA para generación de renders fotorrealistas\n")
+            f.write(''.join(parts))
     
     def _create_gallery(self, base_path, comparatives_folder, configurations):
-        """Crea galería con todas las comparativas"""
+        """Crea galería con todas las comparativas (apiladas en vertical)"""
         gallery_path = base_path / 'GALLERY.jpg'
         
-        n_renders = len(configurations)
-        fig, axes = plt.subplots(n_renders, 1, figsize=(18, 6*n_renders))
-        
-        if n_renders == 1:
-            axes = [axes]
-        
+        rows = []
         for i, config in enumerate(configurations):
             config_name = config.get('name', f'render_{i+1}')
             comp_path = comparatives_folder / f"{config_name}_comparative.jpg"
             
             if comp_path.exists():
-                comp_img = Image.open(comp_path)
-                axes[i].imshow(comp_img)
-                axes[i].set_title(
-                    f"{config_name} - {config.get('description', '')}",
-                    fontsize=14,
-                    fontweight='bold'
-                )
-                axes[i].axis('off')
+                with Image.open(comp_path) as comp_img:
+                    comp_img.load()
+                    rows.append((f"{config_name} - {config.get('description', '')}", comp_img))
         
-        plt.tight_layout()
-        plt.savefig(gallery_path, dpi=150, bbox_inches='tight', facecolor='white')
-        plt.close()
+        if not rows:
+            return
+        
+        width = max(img.width for _, img in rows)
+        height = sum(_CAPTION_HEIGHT + img.height for _, img in rows)
+        canvas = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(canvas)
+        
+        y = 0
+        for caption, img in rows:
+            _draw_centered(draw, (width // 2, y + _CAPTION_HEIGHT // 2), caption, _font(20, bold=True))
+            canvas.paste(img, ((width - img.width) // 2, y + _CAPTION_HEIGHT))
+            y += _CAPTION_HEIGHT + img.height
+        
+        _save_jpeg(canvas, gallery_path, 90)
         
         print(f"   📸 Galería creada: GALLERY.jpg")
+
+
+# Generadores listos para usar, por (device, precisión, compile, modo rápido):
+# un servicio que pide el generador en cada request no vuelve a cargar
+# (ni a compilar) los modelos
+_GENERATORS = {}
+
+
+def get_generator(hardware_profile, fast_mode=False):
+    """
+    Devuelve el generador compartido para este hardware, cargándolo la primera vez
+    
+    Args:
+        hardware_profile: Perfil de hardware del HardwareDetector
+        fast_mode: Ver RenderGenerator.load_models
+    """
+    settings = hardware_profile['recommended_settings']
+    key = (settings['device'], settings['precision'], settings.get('enable_compile', True), fast_mode)
+    
+    generator = _GENERATORS.get(key)
+    if generator is None:
+        generator = RenderGenerator(hardware_profile)
+        generator.load_models(fast_mode=fast_mode)
+        _GENERATORS[key] = generator
+    return generator
@@ -3,39 +3,626 @@
 import platform
 import subprocess
 import psutil
-import torch
 import yaml
 import os
+import sys
+import re
+import hashlib
+import glob
+import shutil
+import importlib.util
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache, cached_property
+from types import MappingProxyType
 from typing import Dict, Optional
 
+PROFILE_PATH = 'config/hardware_profile.yaml'
+
+# Emisor/parser de libyaml (C) si PyYAML se compiló con él
+try:
+    from yaml import CSafeDumper as _YamlDumper, CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper, SafeLoader as _YamlLoader
+
+# Campos medidos del perfil; categoría, tier y settings se derivan
+# siempre en código para que un cambio de tablas no quede oculto por la caché
+_DETECTED_FIELDS = ('os', 'os_version', 'platform', 'cpu', 'ram_gb', 'gpu', 'is_cloud')
+
+# "Apple M1", "Apple M2 Pro", "Apple M3 Max"... (también futuros M5+)
+_APPLE_CHIP_RE = re.compile(r'Apple M(\d+)(?:\s+(Pro|Max|Ultra))?')
+
+# "i7-4770" (4 dígitos: gen = primero) o "i7-10750H" (5 dígitos: gen = dos primeros)
+_INTEL_CORE_I_RE = re.compile(r'i[3579](?:-(\d{5}|\d{4}))?')
+
+# Perfil detectado en este proceso (el hardware no cambia en caliente)
+_PROFILE_CACHE = None
+
+
+@lru_cache(maxsize=1)
+def _torch():
+    """
+    Importa torch solo cuando hace falta detectar GPU
+    
+    Importar torch (y el runtime CUDA) cuesta segundos y cientos de MB; quien
+    solo necesita CPU/RAM/cloud no lo paga. None si torch no está instalado.
+    """
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+@lru_cache(maxsize=1)
+def _cuda_available() -> bool:
+    """torch.cuda.is_available() memoizado (inicializa el driver la primera vez)"""
+    torch = _torch()
+    return torch is not None and torch.cuda.is_available()
+
+
+def _torch_build() -> str:
+    """
+    Contenido de torch/version.py (versión, build CUDA/ROCm) sin importar torch
+    
+    Cambia al instalar otro torch, p. ej. pasar de la build CPU a la CUDA.
+    """
+    try:
+        spec = importlib.util.find_spec('torch')
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None or not spec.submodule_search_locations:
+        return ''
+    try:
+        with open(os.path.join(spec.submodule_search_locations[0], 'version.py'), 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def _gpu_signature() -> str:
+    """
+    Modelo(s) de GPU NVIDIA y versión del driver sin inicializar CUDA
+    
+    Linux: /proc/driver/nvidia; en otros sistemas, nvidia-smi si existe.
+    En Apple Silicon la GPU va con el chip (ya incluido en platform()).
+    """
+    paths = sorted(glob.glob('/proc/driver/nvidia/gpus/*/information'))
+    if paths or os.path.exists('/proc/driver/nvidia/version'):
+        parts = []
+        for path in ['/proc/driver/nvidia/version'] + paths:
+            try:
+                with open(path, 'r') as f:
+                    parts.append(f.read())
+            except OSError:
+                pass
+        return '|'.join(parts)
+    
+    if shutil.which('nvidia-smi'):
+        try:
+            return subprocess.run(
+                ['nvidia-smi', '--query-gpu=name,driver_version', '--format=csv,noheader'],
+                capture_output=True, text=True, timeout=5
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            pass
+    return ''
+
+
+def _machine_fingerprint() -> str:
+    """
+    Hash barato de la máquina para validar el perfil guardado en disco
+    
+    Incluye la build de torch y la GPU/driver: instalar torch con CUDA o
+    cambiar de GPU invalida un perfil detectado antes sin GPU.
+    """
+    key = "|".join((
+        platform.platform(), str(psutil.cpu_count()), str(psutil.virtual_memory().total),
+        _torch_build(), _gpu_signature()
+    ))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _probe_gcp_metadata(timeout=0.2) -> Optional[str]:
+    """
+    Consulta el servidor de metadatos de GCP por IP (sin DNS ni curl)
+    
+    Fuera de GCP la IP link-local no responde: el timeout acota la espera.
+    """
+    request = urllib.request.Request(
+        'http://169.254.169.254/computeMetadata/v1/instance/machine-type',
+        headers={'Metadata-Flavor': 'Google'}
+    )
+    # Sin proxies: la IP link-local nunca debe salir por HTTP(S)_PROXY
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    try:
+        with opener.open(request, timeout=timeout) as response:
+            if response.headers.get('Metadata-Flavor') != 'Google':
+                return None
+            return response.read().decode().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def _load_saved_detection(path=PROFILE_PATH) -> Optional[Dict]:
+    """Lee los campos detectados de un perfil guardado si es de esta máquina"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = yaml.load(f, Loader=_YamlLoader) or {}
+    except (OSError, yaml.YAMLError):
+        return None
+    
+    if saved.get('fingerprint') != _machine_fingerprint():
+        return None
+    if not all(field in saved for field in _DETECTED_FIELDS):
+        return None
+    
+    return {field: saved[field] for field in _DETECTED_FIELDS}
+
+# Tablas fijas por categoría: se construyen una vez al importar y son de
+# solo lectura (MappingProxyType) para que nadie las mute por accidente
+_TIERS = MappingProxyType({
+    # S Tier - Professional/Enterprise
+    'cloud_gpu_high': 'S',
+    'nvidia_gpu_high': 'S',
+    'apple_silicon_ultra': 'S',
+
+    # A Tier - High-end consumer
+    'cloud_gpu_mid': 'A',
+    'nvidia_gpu_mid': 'A',
+    'apple_silicon_max': 'A',
+
+    # B Tier - Mid-range
+    'nvidia_gpu_low': 'B',
+    'apple_silicon_pro': 'B',
+    'intel_mac_modern': 'B',
+
+    # C Tier - Entry level
+    'nvidia_gpu_legacy': 'C',
+    'apple_silicon_base': 'C',
+    'intel_mac_capable': 'C',
+    'cpu_only_high': 'C',
+
+    # D Tier - Minimal
+    'cloud_gpu_low': 'D',
+    'intel_mac_old': 'D',
+    'cpu_only_mid': 'D',
+
+    # F Tier - Incompatible
+    'cpu_only_low': 'F',
+    'legacy_mac_incompatible': 'F',
+    'incompatible': 'F'
+})
+
+_SETTINGS_MAP = MappingProxyType({
+    # S Tier - Professional
+    'cloud_gpu_high': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 1024,
+        'steps': 50,
+        'batch_size': 8,
+        'precision': 'fp16',
+        'enable_xformers': True,
+        'enable_attention_slicing': False,
+        'enable_vae_slicing': False,
+        'cpu_offload': False,
+        'gpu_edge_detection': True,
+        'estimated_time_per_render': '30-60 seconds',
+        'max_recommended_resolution': 2048
+    }),
+    'nvidia_gpu_high': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 1024,
+        'steps': 40,
+        'batch_size': 4,
+        'precision': 'fp16',
+        'enable_xformers': True,
+        'enable_attention_slicing': False,
+        'enable_vae_slicing': False,
+        'cpu_offload': False,
+        'gpu_edge_detection': True,
+        'estimated_time_per_render': '1-2 min',
+        'max_recommended_resolution': 1536
+    }),
+    'apple_silicon_ultra': MappingProxyType({
+        'device': 'mps',
+        'resolution': 1024,
+        'steps': 35,
+        'batch_size': 4,
+        'precision': 'fp16',
+        'enable_attention_slicing': False,
+        'enable_vae_slicing': False,
+        'cpu_offload': False,
+        'estimated_time_per_render': '1-3 min',
+        'max_recommended_resolution': 1536
+    }),
+
+    # A Tier - High-end
+    'cloud_gpu_mid': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 768,
+        'steps': 30,
+        'batch_size': 2,
+        'precision': 'fp16',
+        'enable_xformers': True,
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': False,
+        'cpu_offload': False,
+        'gpu_edge_detection': True,
+        'estimated_time_per_render': '2-4 min',
+        'max_recommended_resolution': 1024
+    }),
+    'nvidia_gpu_mid': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 768,
+        'steps': 30,
+        'batch_size': 2,
+        'precision': 'fp16',
+        'enable_xformers': True,
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'gpu_edge_detection': True,
+        'estimated_time_per_render': '2-5 min',
+        'max_recommended_resolution': 1024
+    }),
+    'apple_silicon_max': MappingProxyType({
+        'device': 'mps',
+        'resolution': 768,
+        'steps': 30,
+        'batch_size': 2,
+        'precision': 'fp16',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '3-6 min',
+        'max_recommended_resolution': 1024
+    }),
+
+    # B Tier - Mid-range
+    'nvidia_gpu_low': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 512,
+        'steps': 25,
+        'batch_size': 1,
+        'precision': 'fp16',
+        'enable_xformers': True,
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'gpu_edge_detection': True,
+        'estimated_time_per_render': '4-8 min',
+        'max_recommended_resolution': 768
+    }),
+    'apple_silicon_pro': MappingProxyType({
+        'device': 'mps',
+        'resolution': 512,
+        'steps': 25,
+        'batch_size': 1,
+        'precision': 'fp16',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '5-10 min',
+        'max_recommended_resolution': 768
+    }),
+    'intel_mac_modern': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 512,
+        'steps': 20,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '8-15 min',
+        'max_recommended_resolution': 512
+    }),
+
+    # C Tier - Entry
+    'nvidia_gpu_legacy': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 384,
+        'steps': 20,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': True,
+        'estimated_time_per_render': '8-12 min',
+        'max_recommended_resolution': 512
+    }),
+    'apple_silicon_base': MappingProxyType({
+        'device': 'mps',
+        'resolution': 512,
+        'steps': 20,
+        'batch_size': 1,
+        'precision': 'fp16',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': True,
+        'estimated_time_per_render': '7-12 min',
+        'max_recommended_resolution': 768
+    }),
+    'intel_mac_capable': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 384,
+        'steps': 15,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '10-18 min',
+        'max_recommended_resolution': 512
+    }),
+    'cpu_only_high': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 512,
+        'steps': 20,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '10-20 min',
+        'max_recommended_resolution': 768
+    }),
+
+    # D Tier - Minimal
+    'cloud_gpu_low': MappingProxyType({
+        'device': 'cuda',
+        'resolution': 384,
+        'steps': 15,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': True,
+        'estimated_time_per_render': '6-10 min',
+        'max_recommended_resolution': 512
+    }),
+    'intel_mac_old': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 384,
+        'steps': 12,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '12-20 min',
+        'max_recommended_resolution': 384
+    }),
+    'cpu_only_mid': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 384,
+        'steps': 12,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '15-25 min',
+        'max_recommended_resolution': 384
+    }),
+
+    # F Tier - Incompatible (valores mínimos para documentación)
+    'legacy_mac_incompatible': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 256,
+        'steps': 10,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': 'N/A - Incompatible',
+        'max_recommended_resolution': 0,
+        'warning': 'Hardware incompatible - requiere CPU con SSSE3/SSE4.2'
+    }),
+    'cpu_only_low': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 256,
+        'steps': 10,
+        'batch_size': 1,
+        'precision': 'fp32',
+        'enable_attention_slicing': True,
+        'enable_vae_slicing': True,
+        'cpu_offload': False,
+        'estimated_time_per_render': '20-40 min',
+        'max_recommended_resolution': 256
+    }),
+    'incompatible': MappingProxyType({
+        'device': 'cpu',
+        'resolution': 0,
+        'steps': 0,
+        'batch_size': 0,
+        'precision': 'fp32',
+        'estimated_time_per_render': 'N/A',
+        'max_recommended_resolution': 0,
+        'warning': 'Hardware no soportado'
+    })
+})
+
+
+# category -> (tier, settings): una sola búsqueda resuelve ambos
+_CATEGORY_TABLE = MappingProxyType({
+    category: (_TIERS[category], settings)
+    for category, settings in _SETTINGS_MAP.items()
+})
+
+
+# Rangos ajustables por tier: (res_min, res_max, steps_min, steps_max)
+_TIER_RANGES = MappingProxyType({
+    'S': (512, 2048, 20, 100),
+    'A': (384, 1536, 15, 75),
+    'B': (256, 1024, 12, 50),
+    'C': (256, 768, 10, 40),
+    'D': (128, 512, 8, 30)
+})
+
+# Recomendaciones por tier: (workflow, tips)
+_TIER_RECOMMENDATIONS = MappingProxyType({
+    'S': ('production_high_quality', (
+        'Puedes usar resoluciones altas (1024px+) sin problemas',
+        'Batch processing recomendado (4-8 imágenes simultáneas)',
+        'Experimenta con pasos altos (40-50) para máxima calidad'
+    )),
+    'A': ('production_balanced', (
+        'Resolución 768px es óptima para tu hardware',
+        'Batch de 2 imágenes para aprovechar GPU',
+        '30 pasos ofrecen excelente balance calidad/velocidad'
+    )),
+    'B': ('development_iteration', (
+        'Usa 512px durante iteración, 768px para renders finales',
+        'Procesa de noche o batch pequeños',
+        '20-25 pasos son suficientes para buenos resultados'
+    )),
+    'C': ('mvp_testing', (
+        'Mantén resolución en 384-512px',
+        'Procesa renders importantes de noche',
+        '15-20 pasos balance aceptable'
+    )),
+    'D': ('minimal_viable', (
+        'Usa 384px máximo',
+        'Deja procesando de noche o fin de semana',
+        'Genera pocas variaciones, elige la mejor'
+    )),
+    'F': ('incompatible', (
+        'Hardware no compatible con este proyecto',
+        'Considera arquitectura cliente-servidor',
+        'O migrar a equipo más moderno'
+    ))
+})
+
+
+@lru_cache(maxsize=64)
+def _build_ranges(tier: str, resolution: int, steps: int) -> Dict:
+    """Rangos de la UI para (tier, resolución y pasos recomendados), memoizados"""
+    if tier == 'F':
+        return {
+            'resolution': {'min': 0, 'max': 0, 'recommended': 0},
+            'steps': {'min': 0, 'max': 0, 'recommended': 0},
+            'message': 'Hardware incompatible'
+        }
+    
+    res_min, res_max, steps_min, steps_max = _TIER_RANGES.get(tier, _TIER_RANGES['D'])
+    
+    return {
+        'resolution': {
+            'min': res_min,
+            'max': res_max,
+            'recommended': resolution,
+            'step': 128
+        },
+        'steps': {
+            'min': steps_min,
+            'max': steps_max,
+            'recommended': steps,
+            'step': 1
+        },
+        'guidance_scale': {
+            'min': 5.0,
+            'max': 15.0,
+            'recommended': 7.0,
+            'step': 0.5
+        },
+        'control_strength': {
+            'min': 0.5,
+            'max': 1.0,
+            'recommended': 0.85,
+            'step': 0.05
+        }
+    }
+
+
 class HardwareDetector:
     """
     Detecta automáticamente el hardware y recomienda configuración óptima.
     Soporta: MacBook Pro (Intel/Apple Silicon), PCs con NVIDIA, Cloud GPUs
     """
     
-    def __init__(self):
-        self.profile = self.detect_hardware()
-        self.recommendations = self._generate_recommendations()
+    def __init__(self, use_cache=True, persist=False):
+        """
+        Args:
+            use_cache: Reutilizar el perfil del proceso o el guardado en disco
+            persist: Guardar en disco (PROFILE_PATH) un perfil recién detectado
+        """
+        self.profile = self._cached_profile(persist) if use_cache else self.detect_hardware()
+    
+    def _cached_profile(self, persist=False) -> Dict:
+        """
+        Perfil desde la caché del proceso, luego desde disco, y solo si no
+        hay ninguno válido lanza la detección completa (y, con persist, la guarda)
+        """
+        global _PROFILE_CACHE
+        
+        if _PROFILE_CACHE is None:
+            detected = _load_saved_detection()
+            if detected is not None:
+                _PROFILE_CACHE = self._complete_profile(detected)
+            else:
+                _PROFILE_CACHE = self.detect_hardware()
+                if persist:
+                    self.profile = _PROFILE_CACHE
+                    try:
+                        self.save_profile(verbose=False)
+                    except OSError:
+                        pass
+        
+        # Copia superficial: quien modifique settings no altera la caché
+        profile = dict(_PROFILE_CACHE)
+        profile['recommended_settings'] = dict(profile['recommended_settings'])
+        return profile
         
     def detect_hardware(self) -> Dict:
         """Detecta especificaciones completas del sistema"""
         
-        profile = {
+        # CPU (subprocess/archivo), GPU (import torch + driver) y cloud (red)
+        # son independientes y de E/S: en paralelo el total es el más lento
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            cpu_future = ex.submit(self._get_cpu_info)
+            gpu_future = ex.submit(self._get_gpu_info)
+            cloud_future = ex.submit(self._detect_cloud_environment)
+            
+            profile = {
+                'os': platform.system(),
+                'os_version': platform.version(),
+                'platform': platform.platform(),
+                'cpu': cpu_future.result(),
+                'ram_gb': psutil.virtual_memory().total / (1024**3),
+                'gpu': gpu_future.result(),
+                'is_cloud': cloud_future.result()
+            }
+        
+        return self._complete_profile(profile)
+    
+    @classmethod
+    def detect_cpu_only(cls) -> Dict:
+        """
+        Detecta sistema, CPU, RAM y cloud sin importar torch
+        
+        Uso: HardwareDetector.detect_cpu_only() (no lanza la detección completa)
+        """
+        self = cls.__new__(cls)
+        return {
             'os': platform.system(),
             'os_version': platform.version(),
             'platform': platform.platform(),
             'cpu': self._get_cpu_info(),
             'ram_gb': psutil.virtual_memory().total / (1024**3),
-            'gpu': self._get_gpu_info(),
             'is_cloud': self._detect_cloud_environment()
         }
-        
+    
+    def _complete_profile(self, profile: Dict) -> Dict:
+        """Añade categoría, tier y settings a los campos detectados"""
         # Categorizar hardware
         profile['category'] = self._categorize_hardware(profile)
-        profile['tier'] = self._get_performance_tier(profile['category'])
-        profile['recommended_settings'] = self._get_recommended_settings(profile['category'])
-        profile['warnings'] = self._get_warnings(profile)
+        tier, settings = _CATEGORY_TABLE.get(profile['category'], _CATEGORY_TABLE['incompatible'])
+        profile['tier'] = tier
+        profile['recommended_settings'] = dict(settings)
         
         return profile
     
@@ -52,60 +639,60 @@ class HardwareDetector:
         
         try:
             if platform.system() == "Darwin":  # macOS
+                # Un solo sysctl: en Intel también las features (una línea por clave);
+                # en Apple Silicon la clave de features no existe
+                keys = ['machdep.cpu.brand_string']
+                if platform.machine() != 'arm64':
+                    keys.append('machdep.cpu.features')
+                
                 result = subprocess.run(
-                    ['sysctl', '-n', 'machdep.cpu.brand_string'],
+                    ['sysctl', '-n', *keys],
                     capture_output=True,
                     text=True
                 )
-                cpu_name = result.stdout.strip()
+                lines = result.stdout.splitlines()
+                cpu_name = lines[0].strip() if lines else ''
+                features = lines[1].strip() if len(lines) > 1 else ''
                 cpu_info['name'] = cpu_name
                 
                 # Detectar tipo de Mac
-                if any(chip in cpu_name for chip in ['M1', 'M2', 'M3', 'M4']):
+                apple_chip = _APPLE_CHIP_RE.search(cpu_name)
+                if apple_chip:
                     cpu_info['type'] = 'apple_silicon'
                     cpu_info['supports_required_instructions'] = True
                     
-                    # Detectar variante (Pro, Max, Ultra)
-                    if 'Max' in cpu_name:
-                        cpu_info['variant'] = 'max'
-                    elif 'Ultra' in cpu_name:
-                        cpu_info['variant'] = 'ultra'
-                    elif 'Pro' in cpu_name:
-                        cpu_info['variant'] = 'pro'
-                    else:
-                        cpu_info['variant'] = 'base'
+                    # Variante (Pro, Max, Ultra); sin sufijo = base
+                    cpu_info['variant'] = (apple_chip.group(2) or 'base').lower()
                         
                 elif 'Intel' in cpu_name:
                     cpu_info['type'] = 'intel_mac'
                     
                     # Verificar instrucciones requeridas
-                    features = subprocess.run(
-                        ['sysctl', '-n', 'machdep.cpu.features'],
-                        capture_output=True,
-                        text=True
-                    ).stdout.strip()
-                    
                     has_ssse3 = 'SSSE3' in features
                     has_sse42 = 'SSE4.2' in features
                     cpu_info['supports_required_instructions'] = has_ssse3 and has_sse42
                     
                     # Detectar generación de Intel Mac
+                    core_i = _INTEL_CORE_I_RE.search(cpu_name)
                     if 'Core 2' in cpu_name:
                         cpu_info['generation'] = 'core2'  # 2006-2010
-                    elif any(gen in cpu_name for gen in ['i3', 'i5', 'i7', 'i9']):
-                        # Extraer generación (e.g., "i7-4770" -> generación 4)
-                        try:
-                            gen_num = int(cpu_name.split('-')[1][0])
+                    elif core_i:
+                        # "i7-4770" -> gen 4, "i7-10750H" -> gen 10
+                        model = core_i.group(1)
+                        if model:
+                            gen_num = int(model[:2]) if len(model) == 5 else int(model[0])
                             cpu_info['generation'] = f'core_i_gen{gen_num}'
-                        except:
+                        else:
                             cpu_info['generation'] = 'core_i_unknown'
                             
             elif platform.system() == "Linux":
                 # Detectar en Linux/Cloud
+                # Basta la primera línea 'model name' (un core): no leer todo el archivo
                 with open('/proc/cpuinfo', 'r') as f:
-                    cpuinfo = f.read()
-                    if 'model name' in cpuinfo:
-                        cpu_info['name'] = cpuinfo.split('model name')[1].split(':')[1].split('\n')[0].strip()
+                    for line in f:
+                        if line.startswith('model name'):
+                            cpu_info['name'] = line.split(':', 1)[1].strip()
+                            break
                 
                 cpu_info['type'] = 'linux_x86'
                 cpu_info['supports_required_instructions'] = True  # Asumimos cloud moderno
@@ -132,16 +719,21 @@ class HardwareDetector:
             'compute_capability': None
         }
         
+        torch = _torch()
+        if torch is None:
+            return gpu_info
+        
         # NVIDIA CUDA
-        if torch.cuda.is_available():
+        if _cuda_available():
+            # Una sola consulta de propiedades: nombre, memoria y compute capability
+            props = torch.cuda.get_device_properties(0)
             gpu_info['available'] = True
             gpu_info['type'] = 'nvidia_cuda'
             gpu_info['count'] = torch.cuda.device_count()
-            gpu_info['name'] = torch.cuda.get_device_name(0)
-            gpu_info['memory_gb'] = torch.cuda.get_device_properties(0).total_memory / (1024**3)
+            gpu_info['name'] = props.name
+            gpu_info['memory_gb'] = props.total_memory / (1024**3)
             
             # Compute capability (importante para compatibilidad)
-            props = torch.cuda.get_device_properties(0)
             gpu_info['compute_capability'] = f"{props.major}.{props.minor}"
             
         # Apple MPS (Metal Performance Shaders)
@@ -162,35 +754,34 @@ class HardwareDetector:
             'instance_type': None
         }
         
-        # AWS
-        if os.path.exists('/sys/hypervisor/uuid'):
-            try:
-                with open('/sys/hypervisor/uuid', 'r') as f:
-                    if f.read().startswith('ec2'):
-                        cloud_info['is_cloud'] = True
-                        cloud_info['provider'] = 'aws'
-            except:
-                pass
+        # Las detecciones de abajo asumen VMs Linux: en macOS/Windows ni syscalls ni red
+        if platform.system() != 'Linux':
+            return cloud_info
         
-        # Google Cloud
+        # AWS (abrir directamente: sin el stat previo de os.path.exists)
         try:
-            result = subprocess.run(
-                ['curl', '-s', '-H', 'Metadata-Flavor: Google', 
-                 'http://metadata.google.internal/computeMetadata/v1/instance/machine-type'],
-                capture_output=True,
-                timeout=1
-            )
-            if result.returncode == 0:
-                cloud_info['is_cloud'] = True
-                cloud_info['provider'] = 'gcp'
-                cloud_info['instance_type'] = result.stdout.decode().strip()
-        except:
+            with open('/sys/hypervisor/uuid', 'r') as f:
+                if f.read().startswith('ec2'):
+                    cloud_info['is_cloud'] = True
+                    cloud_info['provider'] = 'aws'
+        except OSError:
             pass
         
         # Azure
-        if os.path.exists('/var/lib/waagent'):
+        try:
+            os.stat('/var/lib/waagent')
             cloud_info['is_cloud'] = True
             cloud_info['provider'] = 'azure'
+        except OSError:
+            pass
+        
+        # Google Cloud: solo si los archivos locales no identificaron proveedor
+        if not cloud_info['is_cloud']:
+            machine_type = _probe_gcp_metadata()
+            if machine_type is not None:
+                cloud_info['is_cloud'] = True
+                cloud_info['provider'] = 'gcp'
+                cloud_info['instance_type'] = machine_type
         
         return cloud_info
     
@@ -268,290 +859,11 @@ class HardwareDetector:
     
     def _get_performance_tier(self, category: str) -> str:
         """Asigna tier de rendimiento (S, A, B, C, D, F)"""
-        tiers = {
-            # S Tier - Professional/Enterprise
-            'cloud_gpu_high': 'S',
-            'nvidia_gpu_high': 'S',
-            'apple_silicon_ultra': 'S',
-            
-            # A Tier - High-end consumer
-            'cloud_gpu_mid': 'A',
-            'nvidia_gpu_mid': 'A',
-            'apple_silicon_max': 'A',
-            
-            # B Tier - Mid-range
-            'nvidia_gpu_low': 'B',
-            'apple_silicon_pro': 'B',
-            'intel_mac_modern': 'B',
-            
-            # C Tier - Entry level
-            'nvidia_gpu_legacy': 'C',
-            'apple_silicon_base': 'C',
-            'intel_mac_capable': 'C',
-            'cpu_only_high': 'C',
-            
-            # D Tier - Minimal
-            'cloud_gpu_low': 'D',
-            'intel_mac_old': 'D',
-            'cpu_only_mid': 'D',
-            
-            # F Tier - Incompatible
-            'cpu_only_low': 'F',
-            'legacy_mac_incompatible': 'F',
-            'incompatible': 'F'
-        }
-        return tiers.get(category, 'F')
+        return _CATEGORY_TABLE.get(category, _CATEGORY_TABLE['incompatible'])[0]
     
     def _get_recommended_settings(self, category: str) -> Dict:
-        """Configuración recomendada según categoría de hardware"""
-        
-        settings_map = {
-            # S Tier - Professional
-            'cloud_gpu_high': {
-                'device': 'cuda',
-                'resolution': 1024,
-                'steps': 50,
-                'batch_size': 8,
-                'precision': 'fp16',
-                'enable_xformers': True,
-                'enable_attention_slicing': False,
-                'enable_vae_slicing': False,
-                'cpu_offload': False,
-                'estimated_time_per_render': '30-60 seconds',
-                'max_recommended_resolution': 2048
-            },
-            'nvidia_gpu_high': {
-                'device': 'cuda',
-                'resolution': 1024,
-                'steps': 40,
-                'batch_size': 4,
-                'precision': 'fp16',
-                'enable_xformers': True,
-                'enable_attention_slicing': False,
-                'enable_vae_slicing': False,
-                'cpu_offload': False,
-                'estimated_time_per_render': '1-2 min',
-                'max_recommended_resolution': 1536
-            },
-            'apple_silicon_ultra': {
-                'device': 'mps',
-                'resolution': 1024,
-                'steps': 35,
-                'batch_size': 4,
-                'precision': 'fp16',
-                'enable_attention_slicing': False,
-                'enable_vae_slicing': False,
-                'cpu_offload': False,
-                'estimated_time_per_render': '1-3 min',
-                'max_recommended_resolution': 1536
-            },
-            
-            # A Tier - High-end
-            'cloud_gpu_mid': {
-                'device': 'cuda',
-                'resolution': 768,
-                'steps': 30,
-                'batch_size': 2,
-                'precision': 'fp16',
-                'enable_xformers': True,
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': False,
-                'cpu_offload': False,
-                'estimated_time_per_render': '2-4 min',
-                'max_recommended_resolution': 1024
-            },
-            'nvidia_gpu_mid': {
-                'device': 'cuda',
-                'resolution': 768,
-                'steps': 30,
-                'batch_size': 2,
-                'precision': 'fp16',
-                'enable_xformers': True,
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '2-5 min',
-                'max_recommended_resolution': 1024
-            },
-            'apple_silicon_max': {
-                'device': 'mps',
-                'resolution': 768,
-                'steps': 30,
-                'batch_size': 2,
-                'precision': 'fp16',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '3-6 min',
-                'max_recommended_resolution': 1024
-            },
-            
-            # B Tier - Mid-range
-            'nvidia_gpu_low': {
-                'device': 'cuda',
-                'resolution': 512,
-                'steps': 25,
-                'batch_size': 1,
-                'precision': 'fp16',
-                'enable_xformers': True,
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '4-8 min',
-                'max_recommended_resolution': 768
-            },
-            'apple_silicon_pro': {
-                'device': 'mps',
-                'resolution': 512,
-                'steps': 25,
-                'batch_size': 1,
-                'precision': 'fp16',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '5-10 min',
-                'max_recommended_resolution': 768
-            },
-            'intel_mac_modern': {
-                'device': 'cpu',
-                'resolution': 512,
-                'steps': 20,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '8-15 min',
-                'max_recommended_resolution': 512
-            },
-            
-            # C Tier - Entry
-            'nvidia_gpu_legacy': {
-                'device': 'cuda',
-                'resolution': 384,
-                'steps': 20,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': True,
-                'estimated_time_per_render': '8-12 min',
-                'max_recommended_resolution': 512
-            },
-            'apple_silicon_base': {
-                'device': 'mps',
-                'resolution': 512,
-                'steps': 20,
-                'batch_size': 1,
-                'precision': 'fp16',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': True,
-                'estimated_time_per_render': '7-12 min',
-                'max_recommended_resolution': 768
-            },
-            'intel_mac_capable': {
-                'device': 'cpu',
-                'resolution': 384,
-                'steps': 15,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '10-18 min',
-                'max_recommended_resolution': 512
-            },
-            'cpu_only_high': {
-                'device': 'cpu',
-                'resolution': 512,
-                'steps': 20,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '10-20 min',
-                'max_recommended_resolution': 768
-            },
-            
-            # D Tier - Minimal
-            'cloud_gpu_low': {
-                'device': 'cuda',
-                'resolution': 384,
-                'steps': 15,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': True,
-                'estimated_time_per_render': '6-10 min',
-                'max_recommended_resolution': 512
-            },
-            'intel_mac_old': {
-                'device': 'cpu',
-                'resolution': 384,
-                'steps': 12,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '12-20 min',
-                'max_recommended_resolution': 384
-            },
-            'cpu_only_mid': {
-                'device': 'cpu',
-                'resolution': 384,
-                'steps': 12,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '15-25 min',
-                'max_recommended_resolution': 384
-            },
-            
-            # F Tier - Incompatible (valores mínimos para documentación)
-            'legacy_mac_incompatible': {
-                'device': 'cpu',
-                'resolution': 256,
-                'steps': 10,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': 'N/A - Incompatible',
-                'max_recommended_resolution': 0,
-                'warning': 'Hardware incompatible - requiere CPU con SSSE3/SSE4.2'
-            },
-            'cpu_only_low': {
-                'device': 'cpu',
-                'resolution': 256,
-                'steps': 10,
-                'batch_size': 1,
-                'precision': 'fp32',
-                'enable_attention_slicing': True,
-                'enable_vae_slicing': True,
-                'cpu_offload': False,
-                'estimated_time_per_render': '20-40 min',
-                'max_recommended_resolution': 256
-            },
-            'incompatible': {
-                'device': 'cpu',
-                'resolution': 0,
-                'steps': 0,
-                'batch_size': 0,
-                'precision': 'fp32',
-                'estimated_time_per_render': 'N/A',
-                'max_recommended_resolution': 0,
-                'warning': 'Hardware no soportado'
-            }
-        }
-        
-        return settings_map.get(category, settings_map['incompatible'])
+        """Configuración recomendada según categoría de hardware (solo lectura)"""
+        return _CATEGORY_TABLE.get(category, _CATEGORY_TABLE['incompatible'])[1]
     
     def _get_warnings(self, profile: Dict) -> list:
         """Genera advertencias basadas en el hardware detectado"""
@@ -559,7 +871,7 @@ class HardwareDetector:
         
         cpu = profile['cpu']
         gpu = profile['gpu']
-        tier = self._get_performance_tier(profile['category'])
+        tier = profile['tier']
         
         # Advertencia crítica: Hardware incompatible
         if tier == 'F':
@@ -608,156 +920,127 @@ class HardwareDetector:
         
         return warnings
     
+    @cached_property
+    def warnings(self) -> list:
+        """Advertencias del perfil (se calculan al primer acceso)"""
+        return self._get_warnings(self.profile)
+    
+    @cached_property
+    def recommendations(self) -> Dict:
+        """Recomendaciones de uso (se calculan al primer acceso)"""
+        return self._generate_recommendations()
+    
     def _generate_recommendations(self) -> Dict:
         """Genera recomendaciones de uso según hardware"""
-        tier = self.profile['tier']
-        settings = self.profile['recommended_settings']
+        workflow, tips = _TIER_RECOMMENDATIONS.get(self.profile['tier'], _TIER_RECOMMENDATIONS['F'])
         
-        recommendations = {
-            'workflow': None,
-            'tips': [],
+        return {
+            'workflow': workflow,
+            'tips': list(tips),
             'optimizations': []
         }
-        
-        if tier == 'S':
-            recommendations['workflow'] = 'production_high_quality'
-            recommendations['tips'] = [
-                'Puedes usar resoluciones altas (1024px+) sin problemas',
-                'Batch processing recomendado (4-8 imágenes simultáneas)',
-                'Experimenta con pasos altos (40-50) para máxima calidad'
-            ]
-        elif tier == 'A':
-            recommendations['workflow'] = 'production_balanced'
-            recommendations['tips'] = [
-                'Resolución 768px es óptima para tu hardware',
-                'Batch de 2 imágenes para aprovechar GPU',
-                '30 pasos ofrecen excelente balance calidad/velocidad'
-            ]
-        elif tier == 'B':
-            recommendations['workflow'] = 'development_iteration'
-            recommendations['tips'] = [
-                'Usa 512px durante iteración, 768px para renders finales',
-                'Procesa de noche o batch pequeños',
-                '20-25 pasos son suficientes para buenos resultados'
-            ]
-        elif tier == 'C':
-            recommendations['workflow'] = 'mvp_testing'
-            recommendations['tips'] = [
-                'Mantén resolución en 384-512px',
-                'Procesa renders importantes de noche',
-                '15-20 pasos balance aceptable'
-            ]
-        elif tier == 'D':
-            recommendations['workflow'] = 'minimal_viable'
-            recommendations['tips'] = [
-                'Usa 384px máximo',
-                'Deja procesando de noche o fin de semana',
-                'Genera pocas variaciones, elige la mejor'
-            ]
-        else:  # F
-            recommendations['workflow'] = 'incompatible'
-            recommendations['tips'] = [
-                'Hardware no compatible con este proyecto',
-                'Considera arquitectura cliente-servidor',
-                'O migrar a equipo más moderno'
-            ]
-        
-        return recommendations
     
     def print_summary(self):
         """Imprime resumen detallado del hardware detectado"""
         p = self.profile
         
-        print("\n" + "="*70)
-        print("🖥️  DETECCIÓN DE HARDWARE - Interior AI Render")
-        print("="*70)
+        # Se acumula todo y se escribe de una vez (una sola escritura a stdout)
+        parts = []
+        
+        parts.append("\n" + "="*70)
+        parts.append("🖥️  DETECCIÓN DE HARDWARE - Interior AI Render")
+        parts.append("="*70)
         
         # Sistema operativo
-        print(f"\n📱 Sistema Operativo:")
-        print(f"   {p['os']} - {p['platform']}")
+        parts.append(f"\n📱 Sistema Operativo:")
+        parts.append(f"   {p['os']} - {p['platform']}")
         
         # CPU
-        print(f"\n💻 CPU:")
-        print(f"   Modelo: {p['cpu']['name']}")
-        print(f"   Tipo: {p['cpu']['type']}")
-        print(f"   Cores: {p['cpu']['cores']} físicos / {p['cpu']['threads']} threads")
-        print(f"   Arquitectura: {p['cpu']['architecture']}")
+        parts.append(f"\n💻 CPU:")
+        parts.append(f"   Modelo: {p['cpu']['name']}")
+        parts.append(f"   Tipo: {p['cpu']['type']}")
+        parts.append(f"   Cores: {p['cpu']['cores']} físicos / {p['cpu']['threads']} threads")
+        parts.append(f"   Arquitectura: {p['cpu']['architecture']}")
         
         if p['cpu']['supports_required_instructions']:
-            print(f"   ✅ Soporta instrucciones requeridas (SSSE3/SSE4.2)")
+            parts.append(f"   ✅ Soporta instrucciones requeridas (SSSE3/SSE4.2)")
         else:
-            print(f"   ❌ NO soporta instrucciones requeridas (SSSE3/SSE4.2)")
+            parts.append(f"   ❌ NO soporta instrucciones requeridas (SSSE3/SSE4.2)")
         
         # RAM
-        print(f"\n🧠 RAM:")
-        print(f"   Total: {p['ram_gb']:.1f} GB")
+        parts.append(f"\n🧠 RAM:")
+        parts.append(f"   Total: {p['ram_gb']:.1f} GB")
         if p['ram_gb'] >= 32:
-            print(f"   ✅ Excelente para procesamiento de IA")
+            parts.append(f"   ✅ Excelente para procesamiento de IA")
         elif p['ram_gb'] >= 16:
-            print(f"   ✅ Suficiente para la mayoría de tareas")
+            parts.append(f"   ✅ Suficiente para la mayoría de tareas")
         elif p['ram_gb'] >= 8:
-            print(f"   ⚠️  Suficiente para resoluciones bajas")
+            parts.append(f"   ⚠️  Suficiente para resoluciones bajas")
         else:
-            print(f"   ❌ Insuficiente (recomendado 16 GB+)")
+            parts.append(f"   ❌ Insuficiente (recomendado 16 GB+)")
         
         # GPU
-        print(f"\n🎮 GPU:")
+        parts.append(f"\n🎮 GPU:")
         if p['gpu']['available']:
-            print(f"   ✅ Disponible: {p['gpu']['name']}")
-            print(f"   Tipo: {p['gpu']['type']}")
-            print(f"   Memoria: {p['gpu']['memory_gb']:.1f} GB")
+            parts.append(f"   ✅ Disponible: {p['gpu']['name']}")
+            parts.append(f"   Tipo: {p['gpu']['type']}")
+            parts.append(f"   Memoria: {p['gpu']['memory_gb']:.1f} GB")
             if p['gpu']['type'] == 'nvidia_cuda':
-                print(f"   Compute Capability: {p['gpu']['compute_capability']}")
-            print(f"   Dispositivos: {p['gpu']['count']}")
+                parts.append(f"   Compute Capability: {p['gpu']['compute_capability']}")
+            parts.append(f"   Dispositivos: {p['gpu']['count']}")
         else:
-            print(f"   ❌ No disponible - usando CPU")
+            parts.append(f"   ❌ No disponible - usando CPU")
         
         # Cloud
         if p['is_cloud']['is_cloud']:
-            print(f"\n☁️  Entorno Cloud:")
-            print(f"   Proveedor: {p['is_cloud']['provider'].upper()}")
+            parts.append(f"\n☁️  Entorno Cloud:")
+            parts.append(f"   Proveedor: {p['is_cloud']['provider'].upper()}")
             if p['is_cloud']['instance_type']:
-                print(f"   Tipo: {p['is_cloud']['instance_type']}")
+                parts.append(f"   Tipo: {p['is_cloud']['instance_type']}")
         
         # Categoría y Tier
-        print(f"\n⚙️  Categoría de Hardware:")
-        print(f"   Clasificación: {p['category']}")
-        print(f"   Tier de Rendimiento: {p['tier']}")
+        parts.append(f"\n⚙️  Categoría de Hardware:")
+        parts.append(f"   Clasificación: {p['category']}")
+        parts.append(f"   Tier de Rendimiento: {p['tier']}")
         
         # Configuración recomendada
-        print(f"\n📊 CONFIGURACIÓN RECOMENDADA:")
+        parts.append(f"\n📊 CONFIGURACIÓN RECOMENDADA:")
         s = p['recommended_settings']
-        print(f"   Dispositivo: {s['device'].upper()}")
-        print(f"   Resolución: {s['resolution']}px")
-        print(f"   Pasos: {s['steps']}")
-        print(f"   Batch size: {s['batch_size']}")
-        print(f"   Precisión: {s['precision'].upper()}")
-        print(f"   Tiempo estimado: {s['estimated_time_per_render']}")
-        print(f"   Resolución máxima recomendada: {s['max_recommended_resolution']}px")
+        parts.append(f"   Dispositivo: {s['device'].upper()}")
+        parts.append(f"   Resolución: {s['resolution']}px")
+        parts.append(f"   Pasos: {s['steps']}")
+        parts.append(f"   Batch size: {s['batch_size']}")
+        parts.append(f"   Precisión: {s['precision'].upper()}")
+        parts.append(f"   Tiempo estimado: {s['estimated_time_per_render']}")
+        parts.append(f"   Resolución máxima recomendada: {s['max_recommended_resolution']}px")
         
         # Advertencias
-        if p['warnings']:
-            print(f"\n⚠️  ADVERTENCIAS:")
-            for w in p['warnings']:
+        if self.warnings:
+            parts.append(f"\n⚠️  ADVERTENCIAS:")
+            for w in self.warnings:
                 icon = {'critical': '🔴', 'warning': '⚠️ ', 'info': 'ℹ️ '}[w['level']]
-                print(f"   {icon} {w['message']}")
-                print(f"      → {w['suggestion']}")
+                parts.append(f"   {icon} {w['message']}")
+                parts.append(f"      → {w['suggestion']}")
         
         # Recomendaciones
-        print(f"\n💡 RECOMENDACIONES:")
+        parts.append(f"\n💡 RECOMENDACIONES:")
         for tip in self.recommendations['tips']:
-            print(f"   • {tip}")
+            parts.append(f"   • {tip}")
+        
+        parts.append("\n" + "="*70 + "\n")
         
-        print("\n" + "="*70 + "\n")
+        sys.stdout.write('\n'.join(parts) + '\n')
     
-    def save_profile(self, path='config/hardware_profile.yaml'):
+    def save_profile(self, path=PROFILE_PATH, verbose=True):
         """Guarda el perfil detectado"""
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
         # Preparar datos para guardar (convertir a tipos serializables)
         profile_to_save = {
             'detection_date': datetime.now().isoformat(),
+            'fingerprint': _machine_fingerprint(),
             'os': self.profile['os'],
+            'os_version': self.profile['os_version'],
             'platform': self.profile['platform'],
             'cpu': self.profile['cpu'],
             'ram_gb': float(self.profile['ram_gb']),
@@ -766,14 +1049,18 @@ class HardwareDetector:
             'category': self.profile['category'],
             'tier': self.profile['tier'],
             'recommended_settings': self.profile['recommended_settings'],
-            'warnings': self.profile['warnings'],
+            'warnings': self.warnings,
             'recommendations': self.recommendations
         }
         
-        with open(path, 'w') as f:
-            yaml.dump(profile_to_save, f, default_flow_style=False, allow_unicode=True)
+        # Serializar en memoria y escribir en una sola llamada (el emisor
+        # YAML hace muchas escrituras pequeñas si recibe el archivo)
+        content = yaml.dump(profile_to_save, Dumper=_YamlDumper, default_flow_style=False, allow_unicode=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
         
-        print(f"✅ Perfil de hardware guardado en: {path}")
+        if verbose:
+            print(f"✅ Perfil de hardware guardado en: {path}")
     
     def is_compatible(self) -> bool:
         """Verifica si el hardware es compatible"""
@@ -782,58 +1069,13 @@ class HardwareDetector:
     def get_user_adjustable_ranges(self) -> Dict:
         """Retorna rangos ajustables para el usuario"""
         s = self.profile['recommended_settings']
-        tier = self.profile['tier']
-        
-        if tier == 'F':
-            return {
-                'resolution': {'min': 0, 'max': 0, 'recommended': 0},
-                'steps': {'min': 0, 'max': 0, 'recommended': 0},
-                'message': 'Hardware incompatible'
-            }
-        
-        # Rangos por tier
-        ranges = {
-            'S': {'res_min': 512, 'res_max': 2048, 'steps_min': 20, 'steps_max': 100},
-            'A': {'res_min': 384, 'res_max': 1536, 'steps_min': 15, 'steps_max': 75},
-            'B': {'res_min': 256, 'res_max': 1024, 'steps_min': 12, 'steps_max': 50},
-            'C': {'res_min': 256, 'res_max': 768, 'steps_min': 10, 'steps_max': 40},
-            'D': {'res_min': 128, 'res_max': 512, 'steps_min': 8, 'steps_max': 30}
-        }
-        
-        r = ranges.get(tier, ranges['D'])
-        
-        return {
-            'resolution': {
-                'min': r['res_min'],
-                'max': r['res_max'],
-                'recommended': s['resolution'],
-                'step': 128
-            },
-            'steps': {
-                'min': r['steps_min'],
-                'max': r['steps_max'],
-                'recommended': s['steps'],
-                'step': 1
-            },
-            'guidance_scale': {
-                'min': 5.0,
-                'max': 15.0,
-                'recommended': 7.0,
-                'step': 0.5
-            },
-            'control_strength': {
-                'min': 0.5,
-                'max': 1.0,
-                'recommended': 0.85,
-                'step': 0.05
-            }
-        }
+        ranges = _build_ranges(self.profile['tier'], s['resolution'], s['steps'])
+        # Copia de cada nivel: la UI puede ajustar sus rangos sin tocar la caché
+        return {key: dict(value) if isinstance(value, dict) else value for key, value in ranges.items()}
 
 
 if __name__ == "__main__":
-    from datetime import datetime
-    
-    detector = HardwareDetector()
+    detector = HardwareDetector(use_cache=False)
     detector.print_summary()
     detector.save_profile()
     
@@ -4,16 +4,31 @@ Gestor de modelos de IA
 import os
 from typing import Optional
 
+# Directorios de cache ya preparados en este proceso
+_INITIALIZED_DIRS = set()
+
+
+def _init_cache_dir(cache_dir: str):
+    """Crea el cache y configura HuggingFace una sola vez por directorio"""
+    if cache_dir in _INITIALIZED_DIRS:
+        return
+    
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    # Configurar cache de HuggingFace (respetando la config del usuario)
+    os.environ.setdefault('HF_HOME', cache_dir)
+    os.environ.setdefault('TRANSFORMERS_CACHE', cache_dir)
+    
+    _INITIALIZED_DIRS.add(cache_dir)
+
+
 class ModelManager:
     """Gestiona descarga y caché de modelos"""
     
     def __init__(self, cache_dir: str = "models"):
         self.cache_dir = cache_dir
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Configurar cache de HuggingFace
-        os.environ['HF_HOME'] = cache_dir
-        os.environ['TRANSFORMERS_CACHE'] = cache_dir
+        _init_cache_dir(cache_dir)
     
     def get_cache_path(self) -> str:
         """Retorna path del cache"""
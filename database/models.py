@@ -1,16 +1,23 @@
 # database/models.py
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, LargeBinary, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
 import json
+import numpy as np
 
 Base = declarative_base()
 
 class MaterialPreset(Base):
     """Presets de materiales guardados"""
     __tablename__ = 'material_presets'
+    __table_args__ = (
+        # Listado por categoría ordenado por uso (get_all_presets)
+        Index('ix_preset_cat_times', 'category', 'times_used'),
+        # Top global por uso (get_top_presets): ORDER BY ... LIMIT recorre el índice
+        Index('ix_preset_times_used', 'times_used'),
+    )
     
     id = Column(Integer, primary_key=True)
     name = Column(String(100), unique=True, nullable=False)
@@ -22,12 +29,27 @@ class MaterialPreset(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     times_used = Column(Integer, default=0)
     avg_rating = Column(Float, default=0.0)
+    times_rated = Column(Integer, default=0)  # Ratings incluidos en avg_rating
     
     renders = relationship("RenderHistory", back_populates="preset")
 
 class RenderHistory(Base):
     """Historial de renders generados"""
     __tablename__ = 'render_history'
+    __table_args__ = (
+        Index('ix_rh_created_successful', 'created_at', 'is_successful'),
+        Index('ix_rh_preset_rating', 'preset_id', 'user_rating'),
+        # get_successful_renders: igualdad en los dos booleanos, rango en rating
+        Index('ix_render_success_train_rating', 'is_successful', 'marked_for_training', 'user_rating'),
+        # update_learning_metrics: GROUP BY de estilos entre los exitosos
+        Index('ix_render_success_style', 'is_successful', 'style_preset'),
+        # Índice parcial: solo las filas marcadas para entrenamiento
+        Index(
+            'ix_rh_marked', 'marked_for_training',
+            sqlite_where=text('marked_for_training = 1'),
+            postgresql_where=text('marked_for_training = true')
+        ),
+    )
     
     id = Column(Integer, primary_key=True)
     
@@ -48,15 +70,15 @@ class RenderHistory(Base):
     seed = Column(Integer)
     
     # Hardware usado
-    hardware_category = Column(String(50))
-    device_used = Column(String(20))  # 'cpu', 'cuda', 'mps'
+    hardware_category = Column(String(50), index=True)
+    device_used = Column(String(20), index=True)  # 'cpu', 'cuda', 'mps'
     
     # Métricas
     generation_time_seconds = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Feedback del usuario
-    is_successful = Column(Boolean, default=None)  # None = no evaluado
+    is_successful = Column(Boolean, default=None, index=True)  # None = no evaluado
     user_rating = Column(Integer)  # 1-5 estrellas
     user_notes = Column(Text)
     marked_for_training = Column(Boolean, default=False)
@@ -71,11 +93,12 @@ class StyleEmbedding(Base):
     id = Column(Integer, primary_key=True)
     render_id = Column(Integer, ForeignKey('render_history.id'), unique=True)
     
-    # Embedding vectorial del estilo (guardado como JSON)
-    embedding_vector = Column(Text)  # JSON array
+    # Embedding vectorial del estilo (float16 contiguo, ver encode_embedding)
+    embedding_vector = Column(LargeBinary)
+    embedding_dim = Column(Integer, default=512)
     
     # Características extraídas
-    dominant_colors = Column(Text)  # JSON array de colores RGB
+    dominant_colors = Column(LargeBinary)  # uint8, tripletas RGB (ver encode_colors)
     brightness = Column(Float)
     contrast = Column(Float)
     saturation = Column(Float)
@@ -113,6 +136,116 @@ class LearningMetrics(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # Crear engine y sesión
-engine = create_engine('sqlite:///data/renders.db')
+engine = create_engine(
+    'sqlite:///data/renders.db',
+    connect_args={'check_same_thread': False},
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
+
+@event.listens_for(engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL + synchronous=NORMAL: un commit ya no fuerza fsync del journal"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+# Columnas añadidas después de la primera versión del esquema: create_all
+# no altera tablas existentes, así que se añaden aquí si faltan
+# (tabla, columna, DDL, UPDATE de relleno para las filas existentes o None)
+_ADDED_COLUMNS = [
+    # avg_rating ya promedia los ratings guardados: el contador debe partir de
+    # cuántos son, o la siguiente media incremental borraría el historial
+    ('material_presets', 'times_rated', 'INTEGER DEFAULT 0',
+     "UPDATE material_presets SET times_rated = ("
+     "SELECT COUNT(*) FROM render_history "
+     "WHERE render_history.preset_id = material_presets.id "
+     "AND render_history.user_rating IS NOT NULL)"),
+    # Las filas antiguas no guardaban la dimensión: se asume la de siempre (512)
+    ('style_embeddings', 'embedding_dim', 'INTEGER DEFAULT 512', None),
+]
+
+def _upgrade_schema(engine):
+    """Añade columnas e índices nuevos a una BD creada con un esquema anterior (idempotente)"""
+    with engine.begin() as conn:
+        for table, column, ddl, backfill in _ADDED_COLUMNS:
+            existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+                if backfill:
+                    conn.exec_driver_sql(backfill)
+        
+        # create_all tampoco crea índices en tablas que ya existían
+        created = False
+        for table in Base.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA index_list({table.name})")}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    created = True
+        
+        # Estadísticas para que el planificador elija entre los índices
+        # compuestos de render_history (exitosos/rating/estilo) y los antiguos
+        if created:
+            conn.exec_driver_sql("ANALYZE")
+
 Base.metadata.create_all(engine)
+_upgrade_schema(engine)
+# Una sesión propia por repositorio; el pool del engine reutiliza las conexiones
+# (una sesión por hilo haría que repositorios anidados se pisaran los cambios)
 SessionLocal = sessionmaker(bind=engine)
+
+# ===== Serialización binaria de embeddings =====
+
+def encode_embedding(arr) -> bytes:
+    """Vector(es) de embedding -> bytes float16 contiguos"""
+    return np.asarray(arr, dtype=np.float16).tobytes()
+
+def decode_embedding(blob, dim: int = 512) -> np.ndarray:
+    """
+    bytes float16 -> array (N, dim)
+    
+    Acepta también el formato antiguo (lista JSON en texto).
+    """
+    if isinstance(blob, str):
+        return np.asarray(json.loads(blob), dtype=np.float16).reshape(-1, dim)
+    return np.frombuffer(blob, dtype=np.float16).reshape(-1, dim)
+
+def encode_colors(colors) -> bytes:
+    """Lista de colores RGB -> bytes uint8 (3 por color)"""
+    return np.asarray(colors, dtype=np.uint8).tobytes()
+
+def decode_colors(blob) -> np.ndarray:
+    """bytes uint8 -> array (N, 3) de colores RGB"""
+    if isinstance(blob, str):
+        return np.asarray(json.loads(blob), dtype=np.uint8).reshape(-1, 3)
+    return np.frombuffer(blob, dtype=np.uint8).reshape(-1, 3)
+
+def get_all_embeddings_matrix(session, dim: int = 512):
+    """
+    Todos los embeddings de una dimensión en una sola matriz float16
+    
+    Returns:
+        (ids de render, matriz (N, dim)) lista para similitud con un único GEMM
+    """
+    rows = session.query(StyleEmbedding.render_id, StyleEmbedding.embedding_vector).filter(
+        StyleEmbedding.embedding_dim == dim,
+        StyleEmbedding.embedding_vector.isnot(None)
+    ).all()
+    
+    if not rows:
+        return [], np.empty((0, dim), dtype=np.float16)
+    
+    render_ids = [render_id for render_id, _ in rows]
+    matrix = np.concatenate([decode_embedding(blob, dim) for _, blob in rows])
+    return render_ids, matrix
+
+def bulk_log_renders(session, render_dicts):
+    """Inserta varios renders en un solo INSERT por lotes y un único commit"""
+    session.bulk_insert_mappings(RenderHistory, render_dicts)
+    session.commit()
@@ -1,29 +1,168 @@
 # database/repository.py
 
-from database.models import SessionLocal, MaterialPreset, RenderHistory, StyleEmbedding, LearningMetrics
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import joinedload, selectinload, load_only
+import numpy as np
+from database.models import SessionLocal, bulk_log_renders, encode_embedding, decode_embedding, encode_colors, MaterialPreset, RenderHistory, StyleEmbedding, LearningMetrics
+from contextlib import contextmanager
+from collections import Counter
 from datetime import datetime
+from itertools import islice
 import json
-from typing import List, Optional, Dict
+import re
+from typing import List, Optional, Dict, Iterator
+
+# JSON en C (opcional); las columnas siguen siendo texto JSON estándar
+try:
+    import orjson
+    
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    
+    _loads = orjson.loads
+except ImportError:
+    def _numpy_default(obj):
+        """Arrays y escalares NumPy para el json estándar (orjson los serializa solo)"""
+        if isinstance(obj, (np.ndarray, np.generic)):
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    def _dumps(obj) -> str:
+        return json.dumps(obj, default=_numpy_default)
+    
+    _loads = json.loads
+
+# Conteo de materiales compilado (opcional)
+try:
+    from numba import njit
+    from numba.typed import List as TypedList
+except ImportError:
+    njit = None
+
+# Palabras clave de materiales para las métricas de aprendizaje
+MATERIAL_KEYWORDS = ('wood', 'oak', 'walnut', 'marble', 'concrete',
+                     'fabric', 'linen', 'leather', 'metal', 'glass')
+
+# Todas las palabras clave en un solo autómata: una pasada por prompt en vez
+# de una comprobación por palabra y palabra clave. Sin \b, igual que antes:
+# 'wooden' u 'oak-veneer' también cuentan
+_KEYWORD_RE = re.compile('|'.join(map(re.escape, MATERIAL_KEYWORDS)))
+
+# Por debajo de este número de prompts compilar/convertir no compensa
+_JIT_MIN_PROMPTS = 10_000
+
+# Insights ya parseados, (updated_at, dict): compartidos por todos los
+# repositorios del proceso, que son de vida corta (uno por operación)
+_INSIGHTS_CACHE = None
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _count_materials_jit(prompts, keywords):
+        """Mismo conteo que _count_materials, en un bucle nativo"""
+        counts = np.zeros(len(keywords), dtype=np.int64)
+        for prompt in prompts:
+            for word in prompt.split():
+                for k in range(len(keywords)):
+                    if keywords[k] in word:
+                        counts[k] += 1
+        return counts
+
+
+def _count_materials(prompts: List[str], keywords=MATERIAL_KEYWORDS) -> Dict[str, int]:
+    """
+    Cuenta las apariciones de cada palabra clave en los prompts
+    
+    Args:
+        prompts: Prompts ya en minúsculas
+    """
+    if njit is not None and len(prompts) >= _JIT_MIN_PROMPTS:
+        counts = _count_materials_jit(TypedList(prompts), TypedList(keywords))
+        return {kw: int(n) for kw, n in zip(keywords, counts) if n}
+    
+    if keywords == MATERIAL_KEYWORDS:
+        pattern = _KEYWORD_RE
+    else:
+        pattern = re.compile('|'.join(map(re.escape, keywords)))
+    
+    # Una sola pasada en C sobre todos los prompts unidos por '\n': ninguna
+    # palabra clave contiene saltos de línea, así que no hay coincidencias
+    # que crucen de un prompt a otro
+    return dict(Counter(pattern.findall('\n'.join(prompts))))
+
 
 class RenderRepository:
     """Repositorio para acceso a datos"""
     
-    def __init__(self):
-        self.session = SessionLocal()
+    def __init__(self, session=None):
+        """
+        Args:
+            session: Sesión a usar (la gestiona quien la pasa); por defecto,
+                una sesión nueva sobre el pool del engine
+        """
+        self._owns_session = session is None
+        self.session = SessionLocal() if self._owns_session else session
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Descarta lo pendiente y devuelve la conexión al pool, haya o no
+        # excepción; una sesión ajena la cierra quien la creó
+        if self._owns_session:
+            self.session.rollback()
+            self.close()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Agrupa varias escrituras *_nocommit en un único commit
+        
+        Uso:
+            with repo.transaction():
+                for row in rows:
+                    repo.create_preset_nocommit(**row)
+        """
+        try:
+            yield self
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
     
     # ===== PRESETS =====
     
     def create_preset(self, name: str, material_prompt: str, **kwargs) -> MaterialPreset:
         """Crea un nuevo preset de material"""
+        preset = self.create_preset_nocommit(name, material_prompt, **kwargs)
+        self.session.commit()
+        return preset
+    
+    def create_preset_nocommit(self, name: str, material_prompt: str, **kwargs) -> MaterialPreset:
+        """Crea un preset sin hacer commit (usar dentro de transaction())"""
         preset = MaterialPreset(
             name=name,
             material_prompt=material_prompt,
             **kwargs
         )
         self.session.add(preset)
-        self.session.commit()
+        self.session.flush()
         return preset
     
+    def bulk_create_presets(self, rows: List[Dict]):
+        """
+        Inserta muchos presets con un INSERT por lotes y un solo commit
+        
+        render_nulls=True mantiene el mismo conjunto de columnas en todas las
+        filas aunque alguna traiga None, así el lote no se parte.
+        """
+        self.session.bulk_insert_mappings(MaterialPreset, rows, render_nulls=True)
+        self.session.commit()
+    
+    def get_preset_names(self) -> set:
+        """Nombres de todos los presets (una sola consulta, sin cargar objetos)"""
+        return {name for (name,) in self.session.query(MaterialPreset.name)}
+    
     def get_all_presets(self, category: Optional[str] = None) -> List[MaterialPreset]:
         """Obtiene todos los presets, opcionalmente filtrados por categoría"""
         query = self.session.query(MaterialPreset)
@@ -31,6 +170,15 @@ class RenderRepository:
             query = query.filter(MaterialPreset.category == category)
         return query.order_by(MaterialPreset.times_used.desc()).all()
     
+    def get_top_presets(self, limit: int = 5) -> List[MaterialPreset]:
+        """Presets más usados: orden y límite en SQL, no en Python"""
+        return (
+            self.session.query(MaterialPreset)
+            .order_by(MaterialPreset.times_used.desc())
+            .limit(limit)
+            .all()
+        )
+    
     def get_preset_by_name(self, name: str) -> Optional[MaterialPreset]:
         """Obtiene un preset por nombre"""
         return self.session.query(MaterialPreset).filter(MaterialPreset.name == name).first()
@@ -43,25 +191,66 @@ class RenderRepository:
             self.session.commit()
     
     def update_preset_rating(self, preset_id: int, new_rating: int):
-        """Actualiza rating promedio del preset"""
-        preset = self.session.query(MaterialPreset).get(preset_id)
+        """
+        Actualiza rating promedio del preset
+        
+        Media incremental en O(1): no carga la colección `renders`.
+        """
+        preset = self.session.get(MaterialPreset, preset_id)
         if preset:
-            # Calcular nuevo promedio
-            total_renders = len(preset.renders)
-            if total_renders > 0:
-                current_total = preset.avg_rating * (total_renders - 1)
-                preset.avg_rating = (current_total + new_rating) / total_renders
-                self.session.commit()
+            times_rated = (preset.times_rated or 0) + 1
+            avg = preset.avg_rating or 0.0
+            preset.avg_rating = avg + (new_rating - avg) / times_rated
+            preset.times_rated = times_rated
+            self.session.commit()
     
     # ===== HISTORIAL DE RENDERS =====
     
     def save_render(self, **kwargs) -> RenderHistory:
         """Guarda un render en el historial"""
+        render = self.save_render_nocommit(**kwargs)
+        self.session.commit()
+        return render
+    
+    def save_render_nocommit(self, **kwargs) -> RenderHistory:
+        """Guarda un render sin hacer commit (usar dentro de transaction())"""
         render = RenderHistory(**kwargs)
         self.session.add(render)
-        self.session.commit()
+        self.session.flush()
         return render
     
+    def save_renders(self, render_dicts: List[Dict]):
+        """Guarda varios renders (p. ej. un proyecto completo) con un solo commit"""
+        bulk_log_renders(self.session, render_dicts)
+    
+    def save_renders_bulk(self, rows: List[Dict], async_commit: bool = False) -> List[int]:
+        """
+        Inserta muchos renders en un solo INSERT ... VALUES múltiple con RETURNING
+        
+        Todas las filas deben traer el mismo conjunto de columnas (rellenar con
+        None las que falten) para que el driver emita una sola sentencia.
+        
+        Args:
+            rows: Diccionarios columna -> valor
+            async_commit: En PostgreSQL, no esperar al fsync del WAL en este commit
+        
+        Returns:
+            IDs de los renders insertados, en el orden de `rows`
+        """
+        if not rows:
+            return []
+        
+        if async_commit and self.session.get_bind().dialect.name == 'postgresql':
+            self.session.execute(text("SET LOCAL synchronous_commit = OFF"))
+        
+        result = self.session.execute(
+            insert(RenderHistory).returning(RenderHistory.id, sort_by_parameter_order=True),
+            rows
+        )
+        ids = [row[0] for row in result]
+        self.session.commit()
+        return ids
+    
     def mark_render_successful(self, render_id: int, rating: int, notes: str = None, for_training: bool = True):
         """Marca un render como exitoso"""
         render = self.session.query(RenderHistory).get(render_id)
@@ -76,17 +265,45 @@ class RenderRepository:
             if render.preset_id:
                 self.update_preset_rating(render.preset_id, rating)
     
-    def get_successful_renders(self, min_rating: int = 4) -> List[RenderHistory]:
+    def _render_query(self, only_fields: Optional[List[str]] = None):
+        """
+        Query de RenderHistory con las relaciones precargadas (evita N+1)
+        
+        Con `only_fields` se cargan solo esas columnas y no las relaciones.
+        """
+        query = self.session.query(RenderHistory)
+        if only_fields:
+            return query.options(load_only(*(getattr(RenderHistory, f) for f in only_fields)))
+        return query.options(
+            joinedload(RenderHistory.preset),
+            selectinload(RenderHistory.embeddings)
+        )
+    
+    def get_successful_renders(self, min_rating: int = 4,
+                               only_fields: Optional[List[str]] = None) -> List[RenderHistory]:
         """Obtiene renders exitosos para entrenamiento"""
-        return self.session.query(RenderHistory).filter(
+        return self._render_query(only_fields).filter(
             RenderHistory.is_successful == True,
             RenderHistory.user_rating >= min_rating,
             RenderHistory.marked_for_training == True
         ).all()
     
-    def get_render_history(self, limit: int = 50) -> List[RenderHistory]:
+    def iter_successful_renders(self, min_rating: int = 4, chunk_size: int = 500) -> Iterator[RenderHistory]:
+        """
+        Itera renders exitosos por lotes (cursor de servidor + yield_per)
+        
+        Para exportaciones grandes: la memoria queda acotada a `chunk_size` filas.
+        """
+        return self.session.query(RenderHistory).filter(
+            RenderHistory.is_successful == True,
+            RenderHistory.user_rating >= min_rating,
+            RenderHistory.marked_for_training == True
+        ).execution_options(stream_results=True).yield_per(chunk_size)
+    
+    def get_render_history(self, limit: int = 50,
+                           only_fields: Optional[List[str]] = None) -> List[RenderHistory]:
         """Obtiene historial reciente de renders"""
-        return self.session.query(RenderHistory).order_by(
+        return self._render_query(only_fields).order_by(
             RenderHistory.created_at.desc()
         ).limit(limit).all()
     
@@ -94,25 +311,44 @@ class RenderRepository:
     
     def save_style_embedding(self, render_id: int, embedding_data: Dict) -> StyleEmbedding:
         """Guarda embedding de estilo de un render"""
+        embedding = self.save_style_embedding_nocommit(render_id, embedding_data)
+        self.session.commit()
+        return embedding
+    
+    def save_style_embedding_nocommit(self, render_id: int, embedding_data: Dict) -> StyleEmbedding:
+        """Guarda embedding de estilo sin hacer commit (usar dentro de transaction())"""
+        vector = embedding_data.get('vector', [])
         embedding = StyleEmbedding(
             render_id=render_id,
-            embedding_vector=json.dumps(embedding_data.get('vector', [])),
-            dominant_colors=json.dumps(embedding_data.get('colors', [])),
+            embedding_vector=encode_embedding(vector),
+            embedding_dim=len(vector) or 512,
+            dominant_colors=encode_colors(embedding_data.get('colors', [])),
             brightness=embedding_data.get('brightness', 0.0),
             contrast=embedding_data.get('contrast', 0.0),
             saturation=embedding_data.get('saturation', 0.0),
-            detected_materials=json.dumps(embedding_data.get('materials', [])),
-            detected_furniture=json.dumps(embedding_data.get('furniture', [])),
+            detected_materials=_dumps(embedding_data.get('materials', [])),
+            detected_furniture=_dumps(embedding_data.get('furniture', [])),
             lighting_type=embedding_data.get('lighting', 'unknown')
         )
         self.session.add(embedding)
-        self.session.commit()
+        self.session.flush()
         return embedding
     
+    def get_style_vector(self, render_id: int) -> Optional[np.ndarray]:
+        """Vector de estilo de un render (vista float16 sobre el BLOB, sin parseo)"""
+        row = self.session.query(
+            StyleEmbedding.embedding_vector, StyleEmbedding.embedding_dim
+        ).filter(StyleEmbedding.render_id == render_id).first()
+        
+        if row is None or row.embedding_vector is None:
+            return None
+        return decode_embedding(row.embedding_vector, row.embedding_dim or 512)[0]
+    
     # ===== MÉTRICAS DE APRENDIZAJE =====
     
     def update_learning_metrics(self):
         """Actualiza métricas de aprendizaje del sistema"""
+        global _INSIGHTS_CACHE
         
         # Obtener o crear registro de métricas
         metrics = self.session.query(LearningMetrics).first()
@@ -120,85 +356,93 @@ class RenderRepository:
             metrics = LearningMetrics()
             self.session.add(metrics)
         
-        # Calcular métricas
-        all_renders = self.session.query(RenderHistory).all()
-        successful = [r for r in all_renders if r.is_successful == True]
-        
-        metrics.total_renders = len(all_renders)
-        metrics.successful_renders = len(successful)
-        metrics.success_rate = len(successful) / len(all_renders) if all_renders else 0.0
-        
-        # Prompts más exitosos
-        successful_prompts = {}
-        for render in successful:
-            prompt = render.material_prompt
-            if prompt not in successful_prompts:
-                successful_prompts[prompt] = {'count': 0, 'avg_rating': 0, 'ratings': []}
-            successful_prompts[prompt]['count'] += 1
-            if render.user_rating:
-                successful_prompts[prompt]['ratings'].append(render.user_rating)
-        
-        # Calcular promedios
-        for prompt in successful_prompts:
-            ratings = successful_prompts[prompt]['ratings']
-            if ratings:
-                successful_prompts[prompt]['avg_rating'] = sum(ratings) / len(ratings)
-        
-        # Ordenar por rating y guardar top 20
-        top_prompts = sorted(
-            successful_prompts.items(),
-            key=lambda x: (x[1]['avg_rating'], x[1]['count']),
-            reverse=True
-        )[:20]
-        
-        metrics.successful_prompts = json.dumps([
-            {'prompt': p, 'count': d['count'], 'avg_rating': d['avg_rating']}
-            for p, d in top_prompts
+        # Calcular métricas (agregados en SQL, sin traer filas completas)
+        successful_filter = RenderHistory.is_successful == True
+        total = self.session.query(func.count(RenderHistory.id)).scalar()
+        successful_total = self.session.query(func.count(RenderHistory.id)).filter(successful_filter).scalar()
+        
+        metrics.total_renders = total
+        metrics.successful_renders = successful_total
+        metrics.success_rate = successful_total / total if total else 0.0
+        
+        # Prompts más exitosos: top 20 por rating medio y número de usos
+        avg_rating = func.coalesce(func.avg(RenderHistory.user_rating), 0)
+        top_prompts = self.session.query(
+            RenderHistory.material_prompt,
+            func.count(RenderHistory.id),
+            avg_rating
+        ).filter(successful_filter).group_by(
+            RenderHistory.material_prompt
+        ).order_by(
+            avg_rating.desc(), func.count(RenderHistory.id).desc()
+        ).limit(20).all()
+        
+        metrics.successful_prompts = _dumps([
+            {'prompt': p, 'count': count, 'avg_rating': float(avg)}
+            for p, count, avg in top_prompts
         ])
         
-        # Materiales favoritos
-        materials_count = {}
-        for render in successful:
-            # Extraer palabras clave de materiales
-            words = render.material_prompt.lower().split()
-            material_keywords = ['wood', 'oak', 'walnut', 'marble', 'concrete', 
-                               'fabric', 'linen', 'leather', 'metal', 'glass']
-            for word in words:
-                for keyword in material_keywords:
-                    if keyword in word:
-                        materials_count[keyword] = materials_count.get(keyword, 0) + 1
+        # Materiales favoritos (solo se lee la columna del prompt, por lotes)
+        prompt_rows = iter(self.session.query(RenderHistory.material_prompt).filter(
+            successful_filter
+        ).execution_options(stream_results=True).yield_per(_JIT_MIN_PROMPTS))
+        
+        materials_count = Counter()
+        while True:
+            rows = list(islice(prompt_rows, _JIT_MIN_PROMPTS))
+            if not rows:
+                break
+            materials_count.update(_count_materials([prompt.lower() for (prompt,) in rows if prompt]))
+        materials_count = dict(materials_count)
         
-        metrics.favorite_materials = json.dumps(materials_count)
+        metrics.favorite_materials = _dumps(materials_count)
         
         # Estilos favoritos
-        styles_count = {}
-        for render in successful:
-            style = render.style_preset
-            if style:
-                styles_count[style] = styles_count.get(style, 0) + 1
+        styles_count = dict(
+            self.session.query(RenderHistory.style_preset, func.count(RenderHistory.id)).filter(
+                successful_filter,
+                RenderHistory.style_preset.isnot(None),
+                RenderHistory.style_preset != ''
+            ).group_by(RenderHistory.style_preset).all()
+        )
         
-        metrics.favorite_styles = json.dumps(styles_count)
+        metrics.favorite_styles = _dumps(styles_count)
         
         metrics.updated_at = datetime.utcnow()
+        _INSIGHTS_CACHE = None
         self.session.commit()
         
         return metrics
     
     def get_learning_insights(self) -> Dict:
-        """Obtiene insights de aprendizaje del sistema"""
-        metrics = self.session.query(LearningMetrics).first()
-        if not metrics:
+        """
+        Obtiene insights de aprendizaje del sistema
+        
+        Solo se consulta updated_at; los JSON se parsean de nuevo únicamente
+        si las métricas cambiaron desde la última llamada (de cualquier repositorio).
+        """
+        global _INSIGHTS_CACHE
+        updated_at = self.session.query(LearningMetrics.updated_at).limit(1).scalar()
+        if updated_at is None:
             return {}
         
-        return {
+        cached = _INSIGHTS_CACHE
+        if cached is not None and cached[0] == updated_at:
+            return cached[1]
+        
+        metrics = self.session.query(LearningMetrics).first()
+        
+        insights = {
             'total_renders': metrics.total_renders,
             'successful_renders': metrics.successful_renders,
             'success_rate': metrics.success_rate,
-            'top_prompts': json.loads(metrics.successful_prompts) if metrics.successful_prompts else [],
-            'favorite_materials': json.loads(metrics.favorite_materials) if metrics.favorite_materials else {},
-            'favorite_styles': json.loads(metrics.favorite_styles) if metrics.favorite_styles else {}
+            'top_prompts': _loads(metrics.successful_prompts) if metrics.successful_prompts else [],
+            'favorite_materials': _loads(metrics.favorite_materials) if metrics.favorite_materials else {},
+            'favorite_styles': _loads(metrics.favorite_styles) if metrics.favorite_styles else {}
         }
+        _INSIGHTS_CACHE = (updated_at, insights)
+        return insights
     
     def close(self):
-        """Cierra la sesión"""
+        """Cierra la sesión (devuelve la conexión al pool)"""
         self.session.close()
@@ -10,64 +10,192 @@ from database.repository import RenderRepository
 from PIL import Image
 import yaml
 import os
-from datetime import datetime
+import asyncio
+import logging
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Parser de libyaml (C) si PyYAML se compiló con él
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+@lru_cache(maxsize=1)
+def _load_config(path):
+    """Configuración de la app, parseada una sola vez (compartida: no modificar)"""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+# Pool compartido para guardar imágenes (sin crear hilos en cada petición)
+_io_pool = ThreadPoolExecutor(max_workers=4)
+
+# Categoría de iluminación en la UI -> categoría del LightingController
+_LIGHTING_CAT_MAP = {
+    'Natural': 'natural',
+    'Artificial': 'artificial',
+    'Mixta': 'mixed',
+    'Especial': 'special'
+}
+
+logger = logging.getLogger("interior_ai")
+
+
+def _log_db_failure(future):
+    """Callback del registro en BD: los fallos no llegan al usuario, se registran"""
+    if future.exception() is not None:
+        logger.error(f" Error al registrar render en BD: {future.exception()}")
+
+
+# Formatos de salida (config/app_settings.yaml -> output): extensión y opciones de save()
+_SAVE_FORMATS = {
+    # Flags explícitos: sin pasada extra de Huffman ni progresivo, croma 4:2:0
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 95, 'optimize': False,
+                     'progressive': False, 'subsampling': '4:2:0'}),
+    'webp': ('webp', {'format': 'WEBP', 'quality': 90, 'method': 4}),
+    # Sin pérdidas y con compresión mínima: rápido y sin artefactos en los bordes
+    'png': ('png', {'format': 'PNG', 'optimize': False, 'compress_level': 1}),
+}
+
 
 class InteriorAIApp:
     """Aplicación principal con interfaz Gradio"""
     
     def __init__(self):
         # Cargar configuración
-        with open('config/app_settings.yaml', 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = _load_config('config/app_settings.yaml')
         
         # Detectar hardware
-        self.hardware_detector = HardwareDetector()
+        self.hardware_detector = HardwareDetector(persist=True)
+        
+        # Resumen de hardware y valores por defecto, calculados una vez
+        profile = self.hardware_detector.profile
+        self._rec = profile['recommended_settings']
+        self._hw_markdown = f"""
+        **Hardware detectado:**
+        - CPU: {profile['cpu']['name']}
+        - RAM: {profile['ram_gb']:.1f} GB
+        - GPU: {'✅ ' + profile['gpu']['name'] if profile['gpu']['available'] else '❌ No disponible'}
+        - Categoría: {profile['category']}
+        
+        **Configuración recomendada:**
+        - Resolución: {self._rec['resolution']}px
+        - Pasos: {self._rec['steps']}
+        - Tiempo estimado: {self._rec['estimated_time_per_render']}
+        """
         
         # Inicializar componentes
         self.generator = RenderGenerator(self.hardware_detector.profile)
         self.lighting_controller = LightingController()
         self.preset_manager = PresetManager()
-        self.repo = RenderRepository()
         
+        # Búsqueda de iluminación por nombre en O(1) en cada render
+        self._lighting_by_name = {p.name: p for p in self.lighting_controller.get_all_profiles()}
+        # Nombres por categoría de la UI, calculados una vez para los dropdowns
+        self._lighting_names_by_category = {
+            ui_category: [p.name for p in self.lighting_controller.get_profiles_by_category(category)]
+            for ui_category, category in _LIGHTING_CAT_MAP.items()
+        }
+        
+        # Escrituras en BD en un hilo propio, sin bloquear la respuesta
+        self._db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        
+        # Sufijo de los nombres de archivo de cada render
+        self._render_seq = itertools.count()
+        
+        # Los pesos se cargan en segundo plano desde el arranque: la UI responde
+        # de inmediato y la carga se solapa con la elección de presets
         self.models_loaded = False
+        self._load_pool = ThreadPoolExecutor(max_workers=1)
+        self._load_future = self._start_model_load()
+    
+    def _load_and_warm(self):
+        """Carga los modelos y hace un render descartable (kernels y autotune en caliente)"""
+        self.generator.load_models()
+        # Con torch.compile, load_models ya hizo su propio precalentamiento
+        if self.generator.warmed_up:
+            return
+        # A la resolución recomendada: con UNet compilada (dynamic=False) cada
+        # tamaño es un grafo aparte, y este es el que pedirán los usuarios
+        resolution = self._rec['resolution']
+        try:
+            self.generator.generate(
+                input_image=Image.new('RGB', (resolution, resolution), 'gray'),
+                material_prompt="warmup",
+                resolution=resolution,
+                steps=2
+            )
+        except Exception as e:
+            # El precalentamiento es opcional: nunca bloquea la carga
+            logger.warning(f" Precalentamiento omitido: {e}")
+    
+    def _start_model_load(self):
+        """Lanza la carga de modelos en el hilo de fondo"""
+        future = self._load_pool.submit(self._load_and_warm)
+        future.add_done_callback(self._on_models_loaded)
+        return future
+    
+    def _on_models_loaded(self, future):
+        if future.exception() is None:
+            self.models_loaded = True
     
     def load_models(self):
-        """Carga los modelos de IA"""
+        """Carga los modelos de IA (espera a la carga en curso; reintenta si falló)"""
         if self.models_loaded:
             return "✅ Modelos ya cargados"
         
+        if self._load_future.done() and self._load_future.exception() is not None:
+            self._load_future = self._start_model_load()
+        
         try:
-            self.generator.load_models()
+            self._load_future.result()
             self.models_loaded = True
             return "✅ Modelos cargados exitosamente"
         except Exception as e:
             return f"❌ Error: {str(e)}"
     
+    def _poll_load_status(self):
+        """Estado de la carga en segundo plano (sin bloquear)"""
+        if not self._load_future.done():
+            return "⏳ Cargando modelos en segundo plano..."
+        if self.models_loaded or self._load_future.exception() is None:
+            return "✅ Modelos cargados"
+        return f"❌ Error: {self._load_future.exception()}"
+    
+    async def _watch_load_status(self):
+        """Estado al abrir la página y otra vez al terminar la carga (sin sondeo)"""
+        yield self._poll_load_status()
+        if self._load_future.done():
+            return
+        try:
+            # shield: si el cliente se desconecta no se cancela la carga
+            await asyncio.shield(asyncio.wrap_future(self._load_future))
+        except Exception:
+            pass
+        yield self._poll_load_status()
+    
     def get_presets_by_category(self, category):
         """Obtiene presets filtrados por categoría"""
-        presets = self.preset_manager.get_presets_by_category(category)
-        return [p['name'] for p in presets]
+        return list(self.preset_manager.get_preset_names(category))
     
     def get_preset_details(self, preset_name):
         """Obtiene detalles de un preset"""
-        for category, presets in self.preset_manager.presets.items():
-            for p in presets:
-                if p['name'] == preset_name:
-                    return p
-        return None
+        return self.preset_manager.get_preset(preset_name)
     
     def get_lighting_profiles_by_category(self, category):
         """Obtiene perfiles de iluminación por categoría"""
-        category_map = {
-            'Natural': 'natural',
-            'Artificial': 'artificial',
-            'Mixta': 'mixed',
-            'Especial': 'special'
-        }
-        profiles = self.lighting_controller.get_profiles_by_category(category_map[category])
-        return [p.name for p in profiles]
+        return list(self._lighting_names_by_category[category])
     
-    def generate_render(
+    def _save_render_record(self, **fields) -> int:
+        """Registra el render en la base de datos (sesión propia del hilo)"""
+        with RenderRepository() as repo:
+            return repo.save_render(**fields).id
+    
+    async def generate_render(
         self,
         input_image,
         room_category,
@@ -81,26 +209,30 @@ class InteriorAIApp:
         control_strength,
         seed
     ):
-        """Genera el render fotorrealista"""
+        """
+        Genera el render fotorrealista
+        
+        Generador asíncrono: emite el progreso de la difusión, luego las imágenes
+        (antes de guardarlas) y por último el resumen.
+        """
         
         if not self.models_loaded:
-            return None, None, "❌ Primero debes cargar los modelos"
+            yield None, None, "❌ Primero debes cargar los modelos"
+            return
         
         if input_image is None:
-            return None, None, "❌ Debes cargar una imagen"
+            yield None, None, "❌ Debes cargar una imagen"
+            return
         
         try:
             # Obtener detalles del preset
             preset_details = self.get_preset_details(preset_name)
             if not preset_details:
-                return None, None, f"❌ Preset no encontrado: {preset_name}"
+                yield None, None, f"❌ Preset no encontrado: {preset_name}"
+                return
             
             # Encontrar perfil de iluminación
-            lighting_profile = None
-            for profile in self.lighting_controller.get_all_profiles():
-                if profile.name == lighting_profile_name:
-                    lighting_profile = profile
-                    break
+            lighting_profile = self._lighting_by_name.get(lighting_profile_name)
             
             if not lighting_profile:
                 # Usar recomendación
@@ -108,9 +240,19 @@ class InteriorAIApp:
                     room_category.lower().replace(' ', '_')
                 )
             
-            # Generar
-            result = self.generator.generate(
-                input_image=Image.fromarray(input_image) if not isinstance(input_image, Image.Image) else input_image,
+            yield None, None, "⏳ Preparando..."
+            
+            # El pipeline avisa de cada paso desde su hilo; la cola los trae al event loop
+            loop = asyncio.get_running_loop()
+            progress = asyncio.Queue()
+            
+            def on_step(step, total):
+                loop.call_soon_threadsafe(progress.put_nowait, (step, total))
+            
+            # Generar (en un hilo: el event loop de Gradio sigue libre)
+            task = asyncio.ensure_future(asyncio.to_thread(
+                self.generator.generate,
+                input_image=input_image,
                 material_prompt=preset_details['material_prompt'],
                 style_preset=preset_details['style_preset'],
                 lighting_profile=lighting_profile.name if hasattr(lighting_profile, 'name') else 'natural_midday',
@@ -120,19 +262,41 @@ class InteriorAIApp:
                 steps=int(steps),
                 guidance_scale=float(guidance),
                 control_strength=float(control_strength),
-                seed=int(seed) if seed > 0 else None
-            )
+                seed=int(seed) if seed > 0 else None,
+                progress_callback=on_step
+            ))
+            
+            while True:
+                next_step = asyncio.ensure_future(progress.get())
+                done, _ = await asyncio.wait({task, next_step}, return_when=asyncio.FIRST_COMPLETED)
+                if next_step not in done:
+                    next_step.cancel()
+                    break
+                step, total = next_step.result()
+                yield gr.update(), gr.update(), f"⏳ Paso {step}/{total}"
+            
+            result = task.result()
+            yield result['image'], result['control_image'], "💾 Guardando..."
             
             # Guardar outputs
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"outputs/render_{timestamp}.jpg"
-            control_path = f"outputs/control_{timestamp}.jpg"
+            # time_ns + contador: nombres únicos aunque coincidan renders concurrentes
+            stem = f"{time.time_ns()}_{next(self._render_seq)}"
+            output_cfg = self.config.get('output', {})
+            output_ext, output_args = _SAVE_FORMATS[output_cfg.get('format', 'jpeg')]
+            control_ext, control_args = _SAVE_FORMATS[output_cfg.get('control_format', 'jpeg')]
+            output_path = f"outputs/render_{stem}.{output_ext}"
+            control_path = f"outputs/control_{stem}.{control_ext}"
             
-            result['image'].save(output_path, quality=95)
-            result['control_image'].save(control_path, quality=90)
+            # Ambas imágenes en paralelo (los encoders de Pillow liberan el GIL)
+            await asyncio.gather(
+                asyncio.wrap_future(_io_pool.submit(result['image'].save, output_path, **output_args)),
+                asyncio.wrap_future(_io_pool.submit(result['control_image'].save, control_path, **control_args))
+            )
             
-            # Guardar en base de datos
-            render_record = self.repo.save_render(
+            # Registro en BD fuera del camino crítico: el resultado se muestra ya
+            # y el ID se completa cuando termina la escritura
+            db_future = self._db_pool.submit(
+                self._save_render_record,
                 input_image_path="uploaded",
                 output_image_path=output_path,
                 control_image_path=control_path,
@@ -144,12 +308,13 @@ class InteriorAIApp:
                 control_strength=float(control_strength),
                 seed=int(seed) if seed > 0 else None,
                 hardware_category=self.hardware_detector.profile['category'],
-                device_used=self.hardware_detector.profile['recommended_settings']['device']
+                device_used=self._rec['device']
             )
+            db_future.add_done_callback(_log_db_failure)
             
             # Info
             info = f"""
-✅ **Render generado exitosamente** (ID: {render_record.id})
+✅ **Render generado exitosamente** (ID: {{render_id}})
 
 **Configuración:**
 - Preset: {preset_name}
@@ -163,10 +328,16 @@ class InteriorAIApp:
 - {control_path}
             """
             
-            return result['image'], result['control_image'], info
+            yield gr.update(), gr.update(), info.replace('{render_id}', '⏳ pendiente')
+            
+            try:
+                render_id = await asyncio.wrap_future(db_future)
+            except Exception:
+                render_id = '⚠️ no registrado'
+            yield gr.update(), gr.update(), info.replace('{render_id}', str(render_id))
             
         except Exception as e:
-            return None, None, f"❌ Error: {str(e)}"
+            yield None, None, f"❌ Error: {str(e)}"
     
     def create_interface(self):
         """Crea la interfaz Gradio"""
@@ -180,23 +351,12 @@ class InteriorAIApp:
             
             # Información del sistema
             with gr.Accordion("🖥️ Información del Sistema", open=False):
-                gr.Markdown(f"""
-                **Hardware detectado:**
-                - CPU: {self.hardware_detector.profile['cpu']['name']}
-                - RAM: {self.hardware_detector.profile['ram_gb']:.1f} GB
-                - GPU: {'✅ ' + self.hardware_detector.profile['gpu']['name'] if self.hardware_detector.profile['gpu']['available'] else '❌ No disponible'}
-                - Categoría: {self.hardware_detector.profile['category']}
-                
-                **Configuración recomendada:**
-                - Resolución: {self.hardware_detector.profile['recommended_settings']['resolution']}px
-                - Pasos: {self.hardware_detector.profile['recommended_settings']['steps']}
-                - Tiempo estimado: {self.hardware_detector.profile['recommended_settings']['estimated_time_per_render']}
-                """)
+                gr.Markdown(self._hw_markdown)
             
             # Carga de modelos
             with gr.Row():
                 load_btn = gr.Button("🔄 Cargar Modelos de IA", variant="primary", size="lg")
-                load_status = gr.Textbox(label="Estado", value="⏳ Modelos no cargados", interactive=False)
+                load_status = gr.Textbox(label="Estado", value="⏳ Cargando modelos en segundo plano...", interactive=False)
             
             gr.Markdown("---")
             
@@ -207,8 +367,8 @@ class InteriorAIApp:
                     
                     input_image = gr.Image(
                         label="Render 3D Base",
-                        type="numpy",
-                        source="upload"
+                        type="pil",
+                        sources=["upload"]
                     )
                     
                     room_category = gr.Dropdown(
@@ -248,7 +408,7 @@ class InteriorAIApp:
                             minimum=256,
                             maximum=1024,
                             step=128,
-                            value=self.hardware_detector.profile['recommended_settings']['resolution']
+                            value=self._rec['resolution']
                         )
                         
                         steps = gr.Slider(
@@ -256,7 +416,7 @@ class InteriorAIApp:
                             minimum=8,
                             maximum=50,
                             step=1,
-                            value=self.hardware_detector.profile['recommended_settings']['steps']
+                            value=self._rec['steps']
                         )
                         
                         guidance = gr.Slider(
@@ -308,10 +468,14 @@ class InteriorAIApp:
                 profiles = self.get_lighting_profiles_by_category(category)
                 return gr.update(choices=profiles, value=profiles[0] if profiles else None)
             
+            # Presets e iluminación en un solo evento (cambio de habitación y arranque)
+            def update_dropdowns(room_cat, lighting_cat):
+                return update_presets(room_cat), update_lighting_profiles(lighting_cat)
+            
             room_category.change(
-                fn=update_presets,
-                inputs=[room_category],
-                outputs=[preset_name]
+                fn=update_dropdowns,
+                inputs=[room_category, lighting_category],
+                outputs=[preset_name, lighting_profile]
             )
             
             lighting_category.change(
@@ -340,31 +504,54 @@ class InteriorAIApp:
                     control_strength,
                     seed
                 ],
-                outputs=[output_image, control_image, output_info]
+                outputs=[output_image, control_image, output_info],
+                concurrency_limit=self._concurrency_for_category(),
+                concurrency_id="gpu_render"
             )
             
-            # Inicializar presets
+            # Estado de la carga de modelos en segundo plano
             app.load(
-                fn=update_presets,
-                inputs=[room_category],
-                outputs=[preset_name]
+                fn=self._watch_load_status,
+                outputs=[load_status]
             )
             
+            # Inicializar presets e iluminación
             app.load(
-                fn=update_lighting_profiles,
-                inputs=[lighting_category],
-                outputs=[lighting_profile]
+                fn=update_dropdowns,
+                inputs=[room_category, lighting_category],
+                outputs=[preset_name, lighting_profile]
             )
         
         return app
     
+    def _concurrency_for_category(self) -> int:
+        """
+        Renders simultáneos según el hardware
+        
+        La inferencia se serializa en el generador; los slots extra solapan
+        preprocesado, guardado y BD con la GPU. En hardware modesto, uno solo
+        para no arriesgar un OOM.
+        """
+        category = self.hardware_detector.profile['category']
+        if category.endswith('_high') or category == 'apple_silicon_ultra':
+            return 3
+        if category.endswith('_mid') or category == 'apple_silicon_max':
+            return 2
+        return 1
+    
     def launch(self):
         """Lanza la aplicación"""
         app = self.create_interface()
-        app.queue()
+        # Sin límite para los handlers ligeros; los que usan la GPU comparten
+        # concurrency_id="gpu_render" y su cupo fijo (_concurrency_for_category)
+        app.queue(
+            default_concurrency_limit=None,
+            max_size=self.config['app'].get('queue_max_size', 64)
+        )
         app.launch(
             server_name=self.config['app']['host'],
             server_port=self.config['app']['port'],
             share=self.config['app']['share'],
-            inbrowser=True
+            inbrowser=True,
+            max_threads=self.config['app'].get('max_threads', 8)
         )
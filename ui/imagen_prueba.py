@@ -1,23 +1,57 @@
+import hashlib
+import json
+import os
+import sys
+
 from PIL import Image, ImageDraw
 
-# Crear imagen de prueba (sala simple)
-img = Image.new('RGB', (512, 512), color=(240, 240, 240))
-draw = ImageDraw.Draw(img)
+OUTPUT_PATH = 'renders_input/test_room.png'
+# Huella de los parámetros de dibujo: si cambian, la imagen se regenera
+SIDECAR_PATH = 'renders_input/test_room.json'
+
+SIZE = (512, 512)
+BACKGROUND = (240, 240, 240)
+
+# Rectángulos (caja, color) en orden de dibujo
+SHAPES = [
+    # Piso
+    ([0, 350, 512, 512], (180, 150, 120)),
+    # Pared
+    ([0, 0, 512, 350], (230, 230, 230)),
+    # Sofá (rectángulo gris)
+    ([100, 250, 300, 350], (120, 120, 120)),
+    ([100, 200, 300, 250], (100, 100, 100)),
+    # Mesa (marrón)
+    ([320, 280, 420, 320], (139, 90, 60)),
+    ([340, 320, 400, 350], (120, 80, 50)),
+]
+
+
+def _params_hash():
+    return hashlib.sha1(repr((SIZE, BACKGROUND, SHAPES)).encode()).hexdigest()
+
 
-# Piso
-draw.rectangle([0, 350, 512, 512], fill=(180, 150, 120))
+def _is_up_to_date(params_hash):
+    if not (os.path.exists(OUTPUT_PATH) and os.path.exists(SIDECAR_PATH)):
+        return False
+    with open(SIDECAR_PATH, 'r') as f:
+        return json.load(f).get('hash') == params_hash
 
-# Pared
-draw.rectangle([0, 0, 512, 350], fill=(230, 230, 230))
 
-# Sofá (rectángulo gris)
-draw.rectangle([100, 250, 300, 350], fill=(120, 120, 120))
-draw.rectangle([100, 200, 300, 250], fill=(100, 100, 100))
+if __name__ == '__main__':
+    params_hash = _params_hash()
+    if _is_up_to_date(params_hash):
+        print(f"ℹ️  La imagen de prueba ya existe: {OUTPUT_PATH}")
+        sys.exit(0)
 
-# Mesa (marrón)
-draw.rectangle([320, 280, 420, 320], fill=(139, 90, 60))
-draw.rectangle([340, 320, 400, 350], fill=(120, 80, 50))
+    # Crear imagen de prueba (sala simple)
+    img = Image.new('RGB', SIZE, color=BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    for box, fill in SHAPES:
+        draw.rectangle(box, fill=fill)
 
-# Guardar
-img.save('renders_input/test_room.png')
-print("✅ Imagen de prueba creada: renders_input/test_room.png")
+    # Guardar
+    img.save(OUTPUT_PATH)
+    with open(SIDECAR_PATH, 'w') as f:
+        json.dump({'hash': params_hash}, f)
+    print(f"✅ Imagen de prueba creada: {OUTPUT_PATH}")
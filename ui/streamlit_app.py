@@ -10,6 +10,11 @@ import os
 from pathlib import Path
 import io
 import zipfile
+import atexit
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 # Añadir directorio raíz al path
 if '/home/claude' not in sys.path:
@@ -18,6 +23,7 @@ if '/home/claude' not in sys.path:
 from core.generator import RenderGenerator
 from core.hardware_detector import HardwareDetector
 from utils.preset_manager import PresetManager
+from utils.image_fast import fast_thumbnail
 
 
 # Configuración de página
@@ -53,19 +59,30 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# Recursos de solo lectura, compartidos por todas las sesiones del proceso
+@st.cache_resource
+def get_detector():
+    return HardwareDetector(persist=True)
+
+
+@st.cache_resource
+def get_preset_manager():
+    return PresetManager()
+
+
 # Inicialización de session state
 def init_session_state():
     """Inicializa variables de sesión"""
     if 'detector' not in st.session_state:
         with st.spinner('🔍 Detectando hardware...'):
-            st.session_state.detector = HardwareDetector()
+            st.session_state.detector = get_detector()
     
     if 'generator' not in st.session_state:
         st.session_state.generator = None
         st.session_state.models_loaded = False
     
     if 'preset_manager' not in st.session_state:
-        st.session_state.preset_manager = PresetManager()
+        st.session_state.preset_manager = get_preset_manager()
     
     if 'generated_results' not in st.session_state:
         st.session_state.generated_results = []
@@ -104,79 +121,233 @@ def sidebar_config():
         
         st.divider()
         
-        # Parámetros de generación
+        # Parámetros de generación: dentro de un form, mover un slider no
+        # relanza el script; solo se aplica todo junto al pulsar "Aplicar"
         st.subheader("📊 Parámetros")
         
-        # Resolución
-        rec_res = detector.profile['recommended_settings']['resolution']
-        max_res = detector.profile['recommended_settings'].get('max_recommended_resolution', 1024)
-        
-        resolution = st.select_slider(
-            "Resolución",
-            options=[256, 384, 512, 640, 768, 896, 1024],
-            value=rec_res,
-            help=f"Recomendado: {rec_res}px. Máximo recomendado: {max_res}px"
-        )
-        
-        # Pasos
-        rec_steps = detector.profile['recommended_settings']['steps']
-        steps = st.slider(
-            "Pasos de inferencia",
-            min_value=10,
-            max_value=50,
-            value=rec_steps,
-            help="Más pasos = mejor calidad pero más lento"
-        )
-        
-        # Fidelidad geométrica
-        control_strength = st.slider(
-            "Fidelidad geométrica",
-            min_value=0.5,
-            max_value=1.0,
-            value=0.85,
-            step=0.05,
-            help="Qué tan fiel es al render 3D original"
-        )
-        
-        # Guidance scale
-        guidance = st.slider(
-            "Guidance Scale",
-            min_value=5.0,
-            max_value=15.0,
-            value=7.0,
-            step=0.5,
-            help="Control de adherencia al prompt"
-        )
+        with st.form('params'):
+            # Resolución
+            rec_res = detector.profile['recommended_settings']['resolution']
+            max_res = detector.profile['recommended_settings'].get('max_recommended_resolution', 1024)
+            
+            resolution = st.select_slider(
+                "Resolución",
+                options=[256, 384, 512, 640, 768, 896, 1024],
+                value=rec_res,
+                help=f"Recomendado: {rec_res}px. Máximo recomendado: {max_res}px"
+            )
+            
+            # Pasos
+            rec_steps = detector.profile['recommended_settings']['steps']
+            steps = st.slider(
+                "Pasos de inferencia",
+                min_value=10,
+                max_value=50,
+                value=rec_steps,
+                help="Más pasos = mejor calidad pero más lento"
+            )
+            
+            # Fidelidad geométrica
+            control_strength = st.slider(
+                "Fidelidad geométrica",
+                min_value=0.5,
+                max_value=1.0,
+                value=0.85,
+                step=0.05,
+                help="Qué tan fiel es al render 3D original"
+            )
+            
+            # Guidance scale
+            guidance = st.slider(
+                "Guidance Scale",
+                min_value=5.0,
+                max_value=15.0,
+                value=7.0,
+                step=0.5,
+                help="Control de adherencia al prompt"
+            )
+            
+            # Semilla (siempre visible: dentro del form el checkbox no provoca rerun)
+            use_seed = st.checkbox("Usar semilla fija", value=False)
+            seed_value = st.number_input("Semilla", min_value=0, max_value=9999999, value=42)
+            
+            submitted = st.form_submit_button("Aplicar", use_container_width=True)
         
-        # Semilla
-        use_seed = st.checkbox("Usar semilla fija", value=False)
-        seed = None
-        if use_seed:
-            seed = st.number_input("Semilla", min_value=0, max_value=9999999, value=42)
+        if submitted or 'params' not in st.session_state:
+            st.session_state.params = {
+                'resolution': resolution,
+                'steps': steps,
+                'control_strength': control_strength,
+                'guidance_scale': guidance,
+                'seed': seed_value if use_seed else None
+            }
         
-        return {
-            'resolution': resolution,
-            'steps': steps,
-            'control_strength': control_strength,
-            'guidance_scale': guidance,
-            'seed': seed
-        }
+        return st.session_state.params
+
+
+# Extensiones que sí se comprimen en el ZIP (texto); el resto se guarda tal cual
+_DEFLATE_SUFFIXES = {'.txt', '.json', '.yaml', '.yml', '.md', '.csv'}
+
+
+def _project_files(project_path):
+    """Archivos del proyecto con su tamaño y mtime: un solo recorrido, orden estable"""
+    files = []
+    for file_path in Path(project_path).rglob('*'):
+        if file_path.is_file():
+            file_stat = file_path.stat()
+            files.append((str(file_path), file_stat.st_size, file_stat.st_mtime_ns))
+    files.sort()
+    return files
+
+
+def _project_fingerprint(files):
+    """(mtime más reciente, nº de archivos, bytes totales): cambia si cambia el proyecto"""
+    max_mtime = max((mtime for _, _, mtime in files), default=0)
+    return max_mtime, len(files), sum(size for _, size, _ in files)
+
+
+@st.cache_resource
+def _zip_dir() -> Path:
+    """Carpeta temporal de ZIPs del proceso; se borra al salir"""
+    zip_dir = tempfile.mkdtemp(prefix='interior_ai_zips_')
+    atexit.register(shutil.rmtree, zip_dir, ignore_errors=True)
+    return Path(zip_dir)
+
+
+def _build_zip_file(project_path: str, fingerprint: tuple, files=None) -> Path:
+    """
+    ZIP del proyecto escrito en disco; se comprime una vez por versión del proyecto
+    
+    El archivo (con la huella en el nombre) hace de caché y la construcción
+    escribe directo a disco. Ojo: st.download_button lee el archivo entero a su
+    almacén de medios cada vez que se dibuja; por eso en el historial el botón
+    solo aparece tras "Preparar descarga".
+    """
+    key = hashlib.sha1(repr((project_path, fingerprint)).encode()).hexdigest()[:16]
+    zip_path = _zip_dir() / f"{Path(project_path).name}_{key}.zip"
+    if zip_path.exists():
+        return zip_path
+    
+    if files is None:
+        files = _project_files(project_path)
+    parent = Path(project_path).parent
+    
+    # Se escribe en un temporal y se renombra: otra sesión nunca ve un ZIP a medias
+    with tempfile.NamedTemporaryFile(dir=zip_path.parent, suffix='.part', delete=False) as part:
+        try:
+            with zipfile.ZipFile(part, 'w', zipfile.ZIP_STORED, allowZip64=True,
+                                 strict_timestamps=False) as zip_file:
+                for file_path, _, _ in files:
+                    arcname = Path(file_path).relative_to(parent)
+                    # PNG/JPEG ya van comprimidos: solo el texto pasa por DEFLATE (nivel 1)
+                    if Path(file_path).suffix.lower() in _DEFLATE_SUFFIXES:
+                        zip_file.write(file_path, arcname, compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+                    else:
+                        zip_file.write(file_path, arcname)
+        except BaseException:
+            # No dejar el .part a medias en la carpeta de ZIPs
+            part.close()
+            os.unlink(part.name)
+            raise
+    os.replace(part.name, zip_path)
+    
+    return zip_path
 
 
 def create_project_zip(project_path):
-    """Crea un ZIP del proyecto completo"""
-    zip_buffer = io.BytesIO()
+    """Crea (o reutiliza) el ZIP del proyecto completo y devuelve su ruta"""
+    files = _project_files(project_path)
+    return _build_zip_file(str(project_path), _project_fingerprint(files), files)
+
+
+def _build_many_zips(project_paths):
+    """ZIPs de varios proyectos en paralelo (zlib y la E/S de disco sueltan el GIL)"""
+    if len(project_paths) <= 1:
+        return {path: create_project_zip(path) for path in project_paths}
+    with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as pool:
+        return dict(zip(project_paths, pool.map(create_project_zip, project_paths)))
+
+
+# Ancho máximo de las vistas previas (el navegador no necesita más)
+PREVIEW_MAX_SIZE = 512
+
+
+def _thumbnail_bytes(image: Image.Image, max_size: int = PREVIEW_MAX_SIZE) -> bytes:
+    """Vista previa reducida en JPEG: Streamlit envía KB en vez de un PNG a resolución completa"""
+    preview = fast_thumbnail(image, max_size)
+    if preview.mode not in ('RGB', 'L'):
+        preview = preview.convert('RGB')
+    buffer = io.BytesIO()
+    preview.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+@st.cache_data(show_spinner=False)
+def _preview(raw: bytes, max_size: int = PREVIEW_MAX_SIZE) -> bytes:
+    """Vista previa de una imagen codificada, calculada una vez por contenido"""
+    image = Image.open(io.BytesIO(raw))
+    # JPEG: decodifica directamente a escala reducida (1/2, 1/4, 1/8) si alcanza
+    image.draft('RGB', (max_size, max_size))
+    return _thumbnail_bytes(image, max_size)
+
+
+@st.cache_data(show_spinner=False)
+def _image_size(raw: bytes) -> tuple:
+    """(ancho, alto) leídos de la cabecera, sin decodificar los píxeles"""
+    with Image.open(io.BytesIO(raw)) as image:
+        return image.size
+
+
+@st.cache_data(show_spinner=False)
+def _decode_upload(raw: bytes) -> Image.Image:
+    """Decodifica la imagen subida una sola vez por contenido (no en cada rerun)"""
+    return Image.open(io.BytesIO(raw)).convert('RGB')
+
+
+# st.fragment (1.37+) / st.experimental_fragment (1.33+); sin ellos, función normal
+_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+
+@_fragment
+def _history_tab():
+    """Historial de la sesión: sus botones relanzan solo este fragmento, no toda la app"""
+    st.subheader("📊 Historial de Generaciones")
     
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        project_path = Path(project_path)
+    if not st.session_state.generated_results:
+        st.info("No hay renders generados aún en esta sesión")
+    else:
+        # Todos los ZIP pedidos se construyen a la vez; en reruns salen de la caché
+        zips = _build_many_zips([
+            result['project_path']
+            for result in st.session_state.generated_results
+            if result['project_path'] and st.session_state.get(f"zip_ready_{result['project_path']}")
+        ])
         
-        for file_path in project_path.rglob('*'):
-            if file_path.is_file():
-                arcname = file_path.relative_to(project_path.parent)
-                zip_file.write(file_path, arcname)
-    
-    zip_buffer.seek(0)
-    return zip_buffer
+        for i, result in enumerate(reversed(st.session_state.generated_results), 1):
+            with st.expander(f"Proyecto #{len(st.session_state.generated_results) - i + 1}: {result['metadata']['project_name']}", expanded=False):
+                st.markdown(f"**Fecha:** {result['metadata']['created_at']}")
+                st.markdown(f"**Renders:** {len(result['results'])}")
+                st.markdown(f"**Hardware:** {result['metadata']['hardware']['gpu']}")
+                
+                if result['project_path']:
+                    # El ZIP solo se construye cuando el usuario lo pide, no en cada rerun
+                    ready_key = f"zip_ready_{result['project_path']}"
+                    if st.session_state.get(ready_key):
+                        with open(zips[result['project_path']], 'rb') as zip_file:
+                            st.download_button(
+                                label="📥 Descargar",
+                                data=zip_file,
+                                file_name=f"{Path(result['project_path']).name}.zip",
+                                mime="application/zip",
+                                key=f"download_{i}"
+                            )
+                    else:
+                        st.button(
+                            "📦 Preparar descarga",
+                            key=f"prepare_{i}",
+                            on_click=st.session_state.__setitem__,
+                            args=(ready_key, True)
+                        )
 
 
 def main():
@@ -219,9 +390,12 @@ def main():
                 
                 with col1:
                     st.markdown("### 📷 Original")
-                    input_image = Image.open(uploaded_file)
-                    st.image(input_image, use_container_width=True)
-                    st.caption(f"Tamaño: {input_image.size[0]}x{input_image.size[1]}px")
+                    raw = uploaded_file.getvalue()
+                    # Miniatura JPEG en caché: Streamlit no re-codifica la imagen en cada rerun
+                    st.image(_preview(raw), use_container_width=True)
+                    # La imagen completa solo se decodifica al generar (_decode_upload)
+                    width, height = _image_size(raw)
+                    st.caption(f"Tamaño: {width}x{height}px")
                 
                 st.divider()
                 
@@ -241,8 +415,7 @@ def main():
                     )
                     
                     # Presets de la categoría
-                    presets = st.session_state.preset_manager.get_presets_by_category(category)
-                    preset_names = [p['name'] for p in presets]
+                    preset_names = st.session_state.preset_manager.get_preset_names(category)
                     
                     selected_preset_name = st.selectbox(
                         "Preset de materiales",
@@ -251,7 +424,7 @@ def main():
                     )
                     
                     # Obtener preset completo
-                    selected_preset = next(p for p in presets if p['name'] == selected_preset_name)
+                    selected_preset = st.session_state.preset_manager.get_preset(selected_preset_name)
                 
                 with col_b:
                     # Iluminación
@@ -303,7 +476,7 @@ def main():
                                 try:
                                     # Generar con sistema de carpetas
                                     result = st.session_state.generator.generate_with_project_structure(
-                                        input_image=input_image,
+                                        input_image=_decode_upload(raw),
                                         project_name=None,  # Auto
                                         configurations=[{
                                             'name': selected_preset_name.replace(' ', '_'),
@@ -326,21 +499,20 @@ def main():
                                     # Mostrar resultado
                                     with col2:
                                         st.markdown("### ✨ Fotorrealista")
-                                        st.image(result['results'][0]['image'], use_container_width=True)
+                                        st.image(_thumbnail_bytes(result['results'][0]['image']), use_container_width=True)
                                     
                                     # Botón de descarga
                                     st.divider()
                                     st.subheader("📥 Descargar Proyecto")
                                     
-                                    zip_data = create_project_zip(result['project_path'])
-                                    
-                                    st.download_button(
-                                        label="📦 Descargar Proyecto Completo (ZIP)",
-                                        data=zip_data,
-                                        file_name=f"{Path(result['project_path']).name}.zip",
-                                        mime="application/zip",
-                                        use_container_width=True
-                                    )
+                                    with open(create_project_zip(result['project_path']), 'rb') as zip_file:
+                                        st.download_button(
+                                            label="📦 Descargar Proyecto Completo (ZIP)",
+                                            data=zip_file,
+                                            file_name=f"{Path(result['project_path']).name}.zip",
+                                            mime="application/zip",
+                                            use_container_width=True
+                                        )
                                     
                                 except Exception as e:
                                     st.error(f"❌ Error: {str(e)}")
@@ -361,9 +533,6 @@ def main():
                     col_gen1, col_gen2, col_gen3 = st.columns([1, 2, 1])
                     with col_gen2:
                         if st.button("🎨 Generar Variaciones", type="primary", use_container_width=True):
-                            progress_bar = st.progress(0)
-                            status = st.empty()
-                            
                             try:
                                 configs = []
                                 for i, var in enumerate(variations):
@@ -379,38 +548,53 @@ def main():
                                         }
                                     })
                                 
-                                # Generar todas
-                                result = st.session_state.generator.generate_with_project_structure(
-                                    input_image=input_image,
-                                    project_name=None,
-                                    configurations=configs
-                                )
-                                
-                                st.session_state.generated_results.append(result)
+                                # Una sola pasada de difusión solo en CUDA y si el tier admite
+                                # ese tamaño de batch (N× memoria de activaciones)
+                                rec = st.session_state.detector.profile['recommended_settings']
+                                use_batch = rec['device'] == 'cuda' and rec.get('batch_size', 1) >= len(configs)
                                 
-                                progress_bar.progress(1.0)
-                                status.success(f"✅ {len(variations)} variaciones completadas!")
-                                
-                                # Mostrar resultados
-                                st.divider()
-                                st.subheader("✨ Resultados")
+                                # Sin batch, cada variación se muestra en cuanto está lista; en
+                                # batch salen todas juntas al terminar la pasada
+                                label = (f"⏳ Generando {len(configs)} variaciones en un solo batch..."
+                                         if use_batch else "⏳ Generando variaciones...")
+                                with st.status(label, expanded=True) as status:
+                                    cols = st.columns(len(variations))
+                                    slots = []
+                                    for col, var in zip(cols, variations):
+                                        with col:
+                                            st.markdown(f"**{var['name']}**")
+                                            slots.append(st.empty())
+                                    
+                                    def on_render(index, total, image):
+                                        slots[index].image(_thumbnail_bytes(image), use_container_width=True)
+                                        status.update(label=f"⏳ {index + 1}/{total} variaciones")
+                                    
+                                    # Generar todas
+                                    result = st.session_state.generator.generate_with_project_structure(
+                                        input_image=_decode_upload(raw),
+                                        project_name=None,
+                                        configurations=configs,
+                                        batch=use_batch,
+                                        progress_callback=on_render
+                                    )
+                                    
+                                    status.update(
+                                        label=f"✅ {len(variations)} variaciones completadas!",
+                                        state="complete"
+                                    )
                                 
-                                cols = st.columns(len(variations))
-                                for i, (col, res) in enumerate(zip(cols, result['results'])):
-                                    with col:
-                                        st.markdown(f"**{variations[i]['name']}**")
-                                        st.image(res['image'], use_container_width=True)
+                                st.session_state.generated_results.append(result)
                                 
                                 # Descarga
                                 st.divider()
-                                zip_data = create_project_zip(result['project_path'])
-                                st.download_button(
-                                    label="📦 Descargar Proyecto Completo (ZIP)",
-                                    data=zip_data,
-                                    file_name=f"{Path(result['project_path']).name}.zip",
-                                    mime="application/zip",
-                                    use_container_width=True
-                                )
+                                with open(create_project_zip(result['project_path']), 'rb') as zip_file:
+                                    st.download_button(
+                                        label="📦 Descargar Proyecto Completo (ZIP)",
+                                        data=zip_file,
+                                        file_name=f"{Path(result['project_path']).name}.zip",
+                                        mime="application/zip",
+                                        use_container_width=True
+                                    )
                                 
                             except Exception as e:
                                 st.error(f"❌ Error: {str(e)}")
@@ -429,26 +613,7 @@ def main():
                     st.divider()
     
     with tab3:
-        st.subheader("📊 Historial de Generaciones")
-        
-        if not st.session_state.generated_results:
-            st.info("No hay renders generados aún en esta sesión")
-        else:
-            for i, result in enumerate(reversed(st.session_state.generated_results), 1):
-                with st.expander(f"Proyecto #{len(st.session_state.generated_results) - i + 1}: {result['metadata']['project_name']}", expanded=False):
-                    st.markdown(f"**Fecha:** {result['metadata']['created_at']}")
-                    st.markdown(f"**Renders:** {len(result['results'])}")
-                    st.markdown(f"**Hardware:** {result['metadata']['hardware']['gpu']}")
-                    
-                    if result['project_path']:
-                        zip_data = create_project_zip(result['project_path'])
-                        st.download_button(
-                            label="📥 Descargar",
-                            data=zip_data,
-                            file_name=f"{Path(result['project_path']).name}.zip",
-                            mime="application/zip",
-                            key=f"download_{i}"
-                        )
+        _history_tab()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+"""
+Redimensionado rápido de imágenes
+OpenCV (SIMD + hilos) si está instalado; si no, PIL. Pillow-SIMD es una
+alternativa sin cambios de código: misma API que PIL con resize en AVX2.
+"""
+from PIL import Image
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def fast_resize(image: Image.Image, size) -> Image.Image:
+    """
+    Redimensiona a `size` (ancho, alto)
+
+    INTER_AREA al reducir (sin aliasing en miniaturas), bilineal al ampliar.
+    """
+    if cv2 is None or image.mode not in ('RGB', 'L'):
+        return image.resize(size, Image.Resampling.BILINEAR)
+
+    if size[0] < image.width and size[1] < image.height:
+        interpolation = cv2.INTER_AREA
+    else:
+        interpolation = cv2.INTER_LINEAR
+
+    return Image.fromarray(cv2.resize(np.asarray(image), size, interpolation=interpolation))
+
+
+def fast_thumbnail(image: Image.Image, max_size: int) -> Image.Image:
+    """Reduce manteniendo el aspecto hasta que el lado mayor sea `max_size` (nunca amplía)"""
+    scale = max_size / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return fast_resize(image, size)
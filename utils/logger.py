@@ -1,21 +1,28 @@
 """
 Sistema de logging
 """
+import atexit
 import logging
 import os
-from datetime import datetime
+import queue
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 def setup_logger(name: str = "interior_ai", log_dir: str = "logs"):
     """Configura el logger"""
     
-    os.makedirs(log_dir, exist_ok=True)
-    
     logger = logging.getLogger(name)
+    
+    # Idempotente: llamadas repetidas (reruns de Streamlit) no duplican handlers
+    if getattr(logger, '_configured', False):
+        return logger
+    logger._configured = True
+    
+    os.makedirs(log_dir, exist_ok=True)
     logger.setLevel(logging.INFO)
     
-    # Handler para archivo
-    log_file = os.path.join(log_dir, f"{datetime.now().strftime('%Y%m%d')}.log")
-    file_handler = logging.FileHandler(log_file)
+    # Handler para archivo: rota a medianoche (interior_ai.log.AAAA-MM-DD)
+    log_file = os.path.join(log_dir, f"{name}.log")
+    file_handler = TimedRotatingFileHandler(log_file, when='midnight', encoding='utf-8')
     file_handler.setLevel(logging.INFO)
     
     # Handler para consola
@@ -29,7 +36,13 @@ def setup_logger(name: str = "interior_ai", log_dir: str = "logs"):
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
     
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # El logger solo encola; un hilo de fondo escribe en archivo y consola
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    logger._listener = listener
+    atexit.register(listener.stop)  # vacía la cola al salir
     
     return logger
@@ -2,59 +2,106 @@
 
 import yaml
 import os
+from functools import lru_cache
 from database.repository import RenderRepository
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+# Parser de libyaml (C) si PyYAML se compiló con él
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+@lru_cache(maxsize=4)
+def _load_presets(path: str, mtime_ns: int) -> Dict:
+    """YAML de presets parseado una vez por versión del archivo (compartido: no modificar)"""
+    with open(path, 'rb') as f:
+        return yaml.load(f, Loader=_YamlLoader) or {}
+
 
 class PresetManager:
-    """Gestiona presets de materiales"""
+    """
+    Gestiona presets de materiales
+    
+    Sin estado mutable por usuario: una instancia puede compartirse entre
+    sesiones; cada operación de BD abre su propia sesión.
+    """
     
     def __init__(self, config_path='config/material_presets.yaml'):
         self.config_path = config_path
-        self.repo = RenderRepository()
         self.presets = self.load_presets()
+        self._by_name = {
+            p['name']: p
+            for presets in self.presets.values()
+            for p in presets
+        }
+        self._names_by_category = {
+            category: [p['name'] for p in presets]
+            for category, presets in self.presets.items()
+        }
     
     def load_presets(self) -> Dict:
-        """Carga presets desde YAML"""
+        """Carga presets desde YAML (en caché mientras el archivo no cambie)"""
         if os.path.exists(self.config_path):
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return _load_presets(self.config_path, os.stat(self.config_path).st_mtime_ns)
         return {}
     
     def sync_to_database(self):
-        """Sincroniza presets de YAML a base de datos"""
-        for category, presets in self.presets.items():
-            for preset_data in presets:
-                # Verificar si ya existe
-                existing = self.repo.get_preset_by_name(preset_data['name'])
-                if not existing:
-                    self.repo.create_preset(
-                        name=preset_data['name'],
-                        description=preset_data.get('description', ''),
-                        material_prompt=preset_data['material_prompt'],
-                        style_preset=preset_data.get('style_preset', ''),
-                        category=preset_data.get('category', category)
-                    )
+        """Sincroniza presets de YAML a base de datos (un solo INSERT por lotes)"""
+        with RenderRepository() as repo:
+            existing = repo.get_preset_names()
+            
+            rows = []
+            for category, presets in self.presets.items():
+                for preset_data in presets:
+                    if preset_data['name'] in existing:
+                        continue
+                    existing.add(preset_data['name'])
+                    rows.append({
+                        'name': preset_data['name'],
+                        'description': preset_data.get('description', ''),
+                        'material_prompt': preset_data['material_prompt'],
+                        'style_preset': preset_data.get('style_preset', ''),
+                        'category': preset_data.get('category', category)
+                    })
+            
+            if rows:
+                repo.bulk_create_presets(rows)
         print("✅ Presets sincronizados con base de datos")
     
     def get_presets_by_category(self, category: str) -> List[Dict]:
         """Obtiene presets de una categoría específica"""
         return self.presets.get(category, [])
     
+    def get_preset_names(self, category: str) -> List[str]:
+        """Nombres de los presets de una categoría (precalculados al cargar)"""
+        return self._names_by_category.get(category, [])
+    
+    def get_preset(self, name: str) -> Optional[Dict]:
+        """Obtiene un preset por nombre"""
+        return self._by_name.get(name)
+    
     def get_all_categories(self) -> List[str]:
         """Obtiene lista de todas las categorías"""
         return list(self.presets.keys())
     
     def add_custom_preset(self, name: str, material_prompt: str, category: str, **kwargs):
         """Añade un preset personalizado del usuario"""
-        self.repo.create_preset(
-            name=name,
-            material_prompt=material_prompt,
-            category=category,
-            **kwargs
-        )
+        with RenderRepository() as repo:
+            repo.create_preset(
+                name=name,
+                material_prompt=material_prompt,
+                category=category,
+                **kwargs
+            )
         print(f"✅ Preset personalizado '{name}' guardado")
     
     def get_popular_presets(self, limit: int = 5) -> List:
         """Obtiene presets más usados"""
-        all_presets = self.repo.get_all_presets()
-        return sorted(all_presets, key=lambda x: x.times_used, reverse=True)[:limit]
+        with RenderRepository() as repo:
+            top = repo.get_top_presets(limit)
+            # Separarlos antes del rollback de __exit__ para que no queden expirados
+            for preset in top:
+                repo.session.expunge(preset)
+        return top